@@ -0,0 +1,199 @@
+# analytics.py
+#
+# Columnar (Parquet) export of the message tables for analysis, plus
+# aggregate reports computed with Arrow instead of row-by-row loops:
+#
+#   python analytics.py export mydatabase.db analytics/
+#   python analytics.py report analytics/
+#
+# Requires the optional `pyarrow` package.
+
+import argparse
+import os
+import sqlite3
+
+try:
+    import pyarrow as pa
+    import pyarrow.compute as pc
+    import pyarrow.parquet as pq
+except ImportError:
+    pa = None
+
+# Rows fetched from SQLite per Parquet row group
+ANALYTICS_BATCH_SIZE = int(os.environ.get('ANALYTICS_BATCH_SIZE', '100000'))
+# TTS price in USD per 1000 synthesized characters, for the spend report
+TTS_PRICE_PER_1K_CHARACTERS = float(os.environ.get('TTS_PRICE_PER_1K_CHARACTERS', '0.30'))
+
+# Low-cardinality string columns, stored dictionary-encoded
+DICTIONARY_COLUMNS = ['language', 'category', 'theme_name', 'topic_name', 'gender', 'type']
+
+GENERAL_QUERY = """
+    SELECT general.id, language.code AS language, category.name AS category,
+           general.theme_name, general.topic_name, general.gender,
+           COALESCE(general.symbols, LENGTH(general.text), 0) AS symbols,
+           COALESCE(general.text, '') != '' AS has_text,
+           COALESCE(general.audio_file, '') != '' AS has_audio
+    FROM general
+    LEFT JOIN category ON general.category_id = category.id
+    LEFT JOIN language ON category.language_id = language.id
+"""
+
+PERSONAL_QUERY = """
+    SELECT personal.id, language.code AS language, name.name, name.gender, personal.type,
+           COALESCE(LENGTH(personal.text), 0) AS symbols,
+           COALESCE(personal.text, '') != '' AS has_text,
+           COALESCE(personal.audio_file, '') != '' AS has_audio
+    FROM personal
+    LEFT JOIN name ON personal.name_id = name.id
+    LEFT JOIN language ON name.language_id = language.id
+"""
+
+def _require_pyarrow():
+    if pa is None:
+        raise RuntimeError("The analytics export needs pyarrow: pip install pyarrow")
+
+def _schema(columns):
+    column_types = {'id': pa.int64(), 'symbols': pa.int64(), 'has_text': pa.bool_(), 'has_audio': pa.bool_()}
+    fields = []
+    for column in columns:
+        if column in DICTIONARY_COLUMNS:
+            field_type = pa.dictionary(pa.int32(), pa.string())
+        else:
+            field_type = column_types.get(column, pa.string())
+        fields.append(pa.field(column, field_type))
+    return pa.schema(fields)
+
+def _export_table(cursor, query, parquet_file, batch_size):
+    # One row group per batch, so memory stays bounded by the batch size
+    cursor.execute(query)
+    columns = [column[0] for column in cursor.description]
+    schema = _schema(columns)
+    rows_written = 0
+    with pq.ParquetWriter(parquet_file, schema, compression='zstd') as writer:
+        while True:
+            rows = cursor.fetchmany(batch_size)
+            if not rows:
+                break
+            arrays = []
+            for index, field in enumerate(schema):
+                values = [row[index] for row in rows]
+                if pa.types.is_dictionary(field.type):
+                    arrays.append(pa.array(values, pa.string()).dictionary_encode())
+                else:
+                    # SQLite returns comparisons as 0/1 integers
+                    arrays.append(pa.array(values).cast(field.type))
+            writer.write_batch(pa.record_batch(arrays, schema=schema))
+            rows_written += len(rows)
+    return rows_written
+
+def sqlite_to_parquet(db_file, output_dir, batch_size=ANALYTICS_BATCH_SIZE):
+    """
+    Export general.parquet and personal.parquet with language, category and
+    name joined in and the text replaced by its symbol count.
+    """
+    _require_pyarrow()
+    os.makedirs(output_dir, exist_ok=True)
+
+    conn = sqlite3.connect(db_file)
+    cursor = conn.cursor()
+    cursor.execute("BEGIN")
+    counts = {
+        'general': _export_table(cursor, GENERAL_QUERY, os.path.join(output_dir, 'general.parquet'), batch_size),
+        'personal': _export_table(cursor, PERSONAL_QUERY, os.path.join(output_dir, 'personal.parquet'), batch_size),
+    }
+    conn.close()
+    return counts
+
+def read_tables(output_dir):
+    """
+    Read the exported tables, keeping the string columns dictionary-encoded.
+    """
+    _require_pyarrow()
+    tables = {}
+    for table_name in ['general', 'personal']:
+        parquet_file = os.path.join(output_dir, f"{table_name}.parquet")
+        columns = pq.read_schema(parquet_file).names
+        table = pq.read_table(
+            parquet_file, read_dictionary=[column for column in columns if column in DICTIONARY_COLUMNS],
+        )
+        # Every row group has its own dictionary; group_by needs one per column
+        tables[table_name] = table.unify_dictionaries()
+    return tables
+
+def _sorted(report, keys):
+    # Group keys stay dictionary-encoded through the aggregation; decode the
+    # (small) result so it can be sorted
+    for key in keys:
+        column = report[key]
+        if pa.types.is_dictionary(column.type):
+            report = report.set_column(report.schema.get_field_index(key), key, column.cast(pa.string()))
+    return report.sort_by([(key, 'ascending') for key in keys])
+
+def symbols_report(general):
+    """
+    Clip count and symbol statistics per theme.
+    """
+    report = general.group_by('theme_name').aggregate([
+        ('id', 'count'),
+        ('symbols', 'sum'),
+        ('symbols', 'mean'),
+        ('symbols', 'max'),
+    ])
+    return _sorted(report, ['theme_name'])
+
+def coverage_report(general):
+    """
+    Rows, rows with text and rows with audio per (language, theme, gender).
+    """
+    report = general.group_by(['language', 'theme_name', 'gender']).aggregate([
+        ('id', 'count'),
+        ('has_text', 'sum'),
+        ('has_audio', 'sum'),
+    ])
+    audio_coverage = pc.divide(pc.cast(report['has_audio_sum'], pa.float64()), report['id_count'])
+    return _sorted(report.append_column('audio_coverage', audio_coverage), ['language', 'theme_name', 'gender'])
+
+def tts_spend_report(general, personal, price_per_1k_characters=TTS_PRICE_PER_1K_CHARACTERS):
+    """
+    Synthesized characters and their TTS cost per language, over both message tables.
+    """
+    synthesized = pa.concat_tables([
+        table.filter(table['has_audio']).select(['language', 'symbols']).cast(pa.schema([
+            pa.field('language', pa.string()), pa.field('symbols', pa.int64()),
+        ]))
+        for table in (general, personal)
+    ])
+    report = synthesized.group_by('language').aggregate([('symbols', 'count'), ('symbols', 'sum')])
+    spend = pc.multiply(pc.cast(report['symbols_sum'], pa.float64()), price_per_1k_characters / 1000)
+    return _sorted(report.append_column('spend_usd', spend), ['language'])
+
+def print_report(title, report):
+    print(f"\n{title}")
+    print('  '.join(report.column_names))
+    for row in report.to_pylist():
+        print('  '.join(f"{value:.4f}" if isinstance(value, float) else str(value) for value in row.values()))
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Columnar analytics export and reports for the content catalog.")
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    export_parser = subparsers.add_parser('export', help="Write general.parquet and personal.parquet")
+    export_parser.add_argument('db_file', nargs='?', default='mydatabase.db')
+    export_parser.add_argument('output_dir', nargs='?', default='analytics')
+
+    report_parser = subparsers.add_parser('report', help="Print symbol, coverage and TTS spend reports")
+    report_parser.add_argument('output_dir', nargs='?', default='analytics')
+    report_parser.add_argument('--price-per-1k', type=float, default=TTS_PRICE_PER_1K_CHARACTERS)
+
+    args = parser.parse_args()
+    if args.command == 'export':
+        counts = sqlite_to_parquet(args.db_file, args.output_dir)
+        print(f"Exported {counts['general']} general and {counts['personal']} personal rows to {args.output_dir}")
+    else:
+        tables = read_tables(args.output_dir)
+        for title, report in [
+            ('Symbols per theme', symbols_report(tables['general'])),
+            ('Coverage per language, theme and gender', coverage_report(tables['general'])),
+            ('TTS spend per language', tts_spend_report(tables['general'], tables['personal'], args.price_per_1k)),
+        ]:
+            print_report(title, report)
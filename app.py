@@ -1,18 +1,29 @@
 # streamlit run app.py --server.headless true
 
 import streamlit as st
-from database import create_connection, create_tables
+from database import QUERY_LOG_ENABLED, get_connection, query_log, reference_cache_stats
 from config import DATABASE_FILE
 from manage_languages import manage_languages
 from manage_voices import manage_voices
 from manage_categories import manage_categories
 from manage_names import manage_names
-from utils import clear_form_states
+from utils import clear_form_states, show_query_log
 
 def main():
     """
     Main function to run the Streamlit app.
     """
+    if QUERY_LOG_ENABLED:
+        with query_log() as log:
+            dashboard()
+        show_query_log(log, reference_cache_stats(get_connection(DATABASE_FILE)))
+    else:
+        dashboard()
+
+def dashboard():
+    """
+    Render the menu and the selected page.
+    """
     st.title("Dashboard Control Panel")
 
     st.sidebar.header("Menu")
@@ -35,9 +46,9 @@ def main():
 
     choice = st.session_state.menu
 
-    # Initialize the database
-    conn = create_connection(DATABASE_FILE)
-    create_tables(conn)
+    # One connection per process, shared by every rerun and session; the
+    # schema is migrated the first time it is opened
+    conn = get_connection(DATABASE_FILE)
 
     if choice == "Manage Languages":
         manage_languages(conn)
@@ -0,0 +1,364 @@
+# benchmarks.py
+#
+# python benchmarks.py snapshot --general-rows 200000
+# python benchmarks.py export --general-rows 2000000
+# python benchmarks.py db-stress --readers 8 --writers 2 --seconds 10
+
+import argparse
+import json
+import os
+import sqlite3
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import tracemalloc
+from snapshot import write_snapshot
+
+def synthetic_catalog(general_rows, names=1000, languages=3, themes=50):
+    """
+    Build a catalog dict shaped like the sqlite_to_json export.
+    """
+    data = {
+        'languages': [
+            {'id': i + 1, 'name': f"Language {i + 1}", 'code': f"l{i + 1}"}
+            for i in range(languages)
+        ],
+        'voices': [
+            {
+                'id': i + 1,
+                'name': f"Voice {i + 1}",
+                'elevenlabs_voice_id': f"voice{i + 1}",
+                'gender': ['male', 'female'][i % 2],
+                'language_id': i // 2 + 1,
+            }
+            for i in range(languages * 2)
+        ],
+        'names': [
+            {
+                'id': i + 1,
+                'name': f"Name {i + 1}",
+                'gender': ['male', 'female'][i % 2],
+                'language_id': i % languages + 1,
+            }
+            for i in range(names)
+        ],
+        'categories': [
+            {'id': i + 1, 'name': f"Category {i + 1}", 'language_id': i + 1}
+            for i in range(languages)
+        ],
+        'personal': [
+            {
+                'id': i + 1,
+                'name_id': i + 1,
+                'text': f"Hello, Name {i + 1}!",
+                'type': 'greeting',
+                'audio_file': f"greeting-{i + 1}.mp3",
+            }
+            for i in range(names)
+        ],
+        'general': [
+            {
+                'id': i + 1,
+                'category_id': i % languages + 1,
+                'theme_name': f"Theme {i % themes}",
+                'topic_name': f"Topic {i}",
+                'text': f"Motivational text number {i} " * 4,
+                'audio_file': f"general-{i + 1}.mp3",
+                'symbols': 112,
+                'gender': ['male', 'female'][i % 2],
+            }
+            for i in range(general_rows)
+        ],
+    }
+    return data
+
+# Runs in a fresh interpreter so each format gets its own peak RSS
+_LOAD_SCRIPT = '''
+import json, resource, sys, time
+
+def peak_rss_kb():
+    # ru_maxrss survives exec on Linux, so prefer the per-process high-water mark
+    try:
+        with open('/proc/self/status') as f:
+            for line in f:
+                if line.startswith('VmHWM:'):
+                    return int(line.split()[1])
+    except OSError:
+        pass
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+start = time.perf_counter()
+if sys.argv[1] == 'json':
+    with open(sys.argv[2], 'r', encoding='utf-8') as f:
+        data = json.load(f)
+else:
+    from snapshot import open_snapshot
+    data = open_snapshot(sys.argv[2])
+opened = time.perf_counter()
+themes = {g['theme_name'] for g in data['general']}
+scanned = time.perf_counter()
+print(json.dumps({
+    'open_ms': (opened - start) * 1000,
+    'scan_ms': (scanned - opened) * 1000,
+    'max_rss_kb': peak_rss_kb(),
+}))
+'''
+
+def synthetic_database(db_file, general_rows, names=1000, languages=3, themes=50):
+    """
+    Create a dashboard database shaped like synthetic_catalog, inserting rows from generators.
+    """
+    from database import create_connection, create_tables
+
+    conn = create_connection(db_file)
+    create_tables(conn)
+    cursor = conn.cursor()
+    cursor.executemany(
+        "INSERT INTO language (id, name, code) VALUES (?, ?, ?)",
+        ((i + 1, f"Language {i + 1}", f"l{i + 1}") for i in range(languages)),
+    )
+    cursor.executemany(
+        "INSERT INTO category (id, name, language_id) VALUES (?, ?, ?)",
+        ((i + 1, f"Category {i + 1}", i + 1) for i in range(languages)),
+    )
+    cursor.executemany(
+        "INSERT INTO name (id, name, gender, language_id) VALUES (?, ?, ?, ?)",
+        ((i + 1, f"Name {i + 1}", ['male', 'female'][i % 2], i % languages + 1) for i in range(names)),
+    )
+    cursor.executemany(
+        "INSERT INTO personal (name_id, text, type, audio_file) VALUES (?, ?, 'greeting', ?)",
+        ((i + 1, f"Hello, Name {i + 1}!", f"greeting-{i + 1}.mp3") for i in range(names)),
+    )
+    cursor.executemany(
+        """
+        INSERT INTO general (category_id, theme_name, topic_name, text, audio_file, symbols, gender)
+        VALUES (?, ?, ?, ?, ?, 112, ?)
+        """,
+        (
+            (i % languages + 1, f"Theme {i % themes}", f"Topic {i}", f"Motivational text number {i} " * 4,
+             f"general-{i + 1}.mp3", ['male', 'female'][i % 2])
+            for i in range(general_rows)
+        ),
+    )
+    conn.commit()
+    conn.close()
+
+# Old exporter (fetchall into one dict, then json.dump) vs the streaming one
+_EXPORT_SCRIPT = _LOAD_SCRIPT.split('start = ')[0] + '''
+import sqlite_to_json
+
+start = time.perf_counter()
+if sys.argv[1] == 'fetchall':
+    with open(sys.argv[3], 'w', encoding='utf-8') as f:
+        json.dump(sqlite_to_json.fetch_catalog(sys.argv[2]), f, ensure_ascii=False, indent=4)
+else:
+    sqlite_to_json.sqlite_to_json(sys.argv[2], sys.argv[3], compact=sys.argv[1] == 'compact')
+print(json.dumps({
+    'export_ms': (time.perf_counter() - start) * 1000,
+    'max_rss_kb': peak_rss_kb(),
+}))
+'''
+
+def _measure(kind, path):
+    output = subprocess.check_output(
+        [sys.executable, '-c', _LOAD_SCRIPT, kind, path],
+        cwd=os.path.dirname(os.path.abspath(__file__)),
+    )
+    return json.loads(output)
+
+def bench_snapshot(general_rows):
+    """
+    Compare cold load time and peak RSS of data.json against the binary snapshot.
+    """
+    data = synthetic_catalog(general_rows)
+    with tempfile.TemporaryDirectory() as tmp:
+        json_file = os.path.join(tmp, 'data.json')
+        snapshot_file = os.path.join(tmp, 'data.snap')
+        with open(json_file, 'w', encoding='utf-8') as f:
+            json.dump(data, f, ensure_ascii=False, indent=4)
+        write_snapshot(data, snapshot_file)
+
+        print(f"general rows: {general_rows}")
+        for kind, path in [('json', json_file), ('snapshot', snapshot_file)]:
+            result = _measure(kind, path)
+            print(
+                f"{kind:>8}: size {os.path.getsize(path) / 1024 / 1024:8.1f} MiB"
+                f"  open {result['open_ms']:8.1f} ms"
+                f"  open+scan {result['open_ms'] + result['scan_ms']:8.1f} ms"
+                f"  max RSS {result['max_rss_kb'] / 1024:8.1f} MiB"
+            )
+
+def bench_export(general_rows):
+    """
+    Compare time and peak RSS of the fetchall exporter with the streaming exporter.
+    """
+    with tempfile.TemporaryDirectory() as tmp:
+        db_file = os.path.join(tmp, 'catalog.db')
+        synthetic_database(db_file, general_rows)
+
+        print(f"general rows: {general_rows}")
+        for kind in ['fetchall', 'streaming', 'compact']:
+            json_file = os.path.join(tmp, f"{kind}.json")
+            output = subprocess.check_output(
+                [sys.executable, '-c', _EXPORT_SCRIPT, kind, db_file, json_file],
+                cwd=os.path.dirname(os.path.abspath(__file__)),
+            )
+            result = json.loads(output)
+            print(
+                f"{kind:>9}: size {os.path.getsize(json_file) / 1024 / 1024:8.1f} MiB"
+                f"  export {result['export_ms']:9.1f} ms"
+                f"  max RSS {result['max_rss_kb'] / 1024:8.1f} MiB"
+            )
+
+# Connection profile of the dashboard before WAL: rollback journal, no busy timeout
+ROLLBACK_PROFILE = {'journal_mode': 'DELETE', 'synchronous': 'FULL', 'busy_timeout': 0}
+
+def _percentile(values, percent):
+    values = sorted(values)
+    return values[min(len(values) - 1, len(values) * percent // 100)] if values else 0.0
+
+def _stress(db_file, profile, readers, writers, seconds, batch_size):
+    from database import SharedConnection, apply_connection_profile, fetch_all, write_transaction
+
+    counts = {'reads': 0, 'writes': 0, 'exports': 0, 'read_errors': 0, 'write_errors': 0, 'export_errors': 0}
+    read_ms = []
+    counts_lock = threading.Lock()
+    stop = time.monotonic() + seconds
+
+    def count(key, value=1):
+        with counts_lock:
+            counts[key] += value
+
+    # Dashboard sessions share one connection, as handed out by database.get_connection
+    shared = sqlite3.connect(db_file, check_same_thread=False, factory=SharedConnection)
+    apply_connection_profile(shared, profile)
+
+    def reader(index):
+        while time.monotonic() < stop:
+            started = time.perf_counter()
+            try:
+                fetch_all(
+                    shared, "SELECT * FROM general WHERE category_id = ? AND theme_name = ?",
+                    (index % 3 + 1, f"Theme {index % 50}"),
+                )
+                count('reads')
+            except sqlite3.OperationalError:
+                count('read_errors')
+            with counts_lock:
+                read_ms.append((time.perf_counter() - started) * 1000)
+
+    def writer(index):
+        # Like a generation loop: short transactions of a few rows each
+        while time.monotonic() < stop:
+            try:
+                with write_transaction(shared) as cursor:
+                    cursor.executemany(
+                        "INSERT INTO general (category_id, theme_name, topic_name, gender) VALUES (?, ?, ?, 'male')",
+                        [(index % 3 + 1, f"Theme {index % 50}", f"Stress {index}") for _ in range(batch_size)],
+                    )
+                count('writes', batch_size)
+            except sqlite3.OperationalError:
+                count('write_errors')
+
+    def exporter():
+        # sqlite_to_json in another process: its own default connection, one read transaction per export
+        conn = sqlite3.connect(db_file)
+        while time.monotonic() < stop:
+            try:
+                conn.execute("BEGIN")
+                conn.execute("SELECT * FROM general").fetchall()
+                conn.rollback()
+                count('exports')
+            except sqlite3.OperationalError:
+                conn.rollback()
+                count('export_errors')
+        conn.close()
+
+    threads = [threading.Thread(target=reader, args=(i,)) for i in range(readers)]
+    threads += [threading.Thread(target=writer, args=(i,)) for i in range(writers)]
+    threads.append(threading.Thread(target=exporter))
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    shared.close()
+    counts['read_p95_ms'] = _percentile(read_ms, 95)
+    return counts
+
+def bench_db_stress(general_rows, readers, writers, seconds, batch_size):
+    """
+    Dashboard sessions on one shared connection plus an exporter process, per connection profile.
+    """
+    from database import CONNECTION_PROFILE
+
+    print(f"general rows: {general_rows}, {readers} readers, {writers} writers, 1 exporter, {seconds} s")
+    for label, profile in [('rollback', ROLLBACK_PROFILE), ('wal', CONNECTION_PROFILE)]:
+        with tempfile.TemporaryDirectory() as tmp:
+            db_file = os.path.join(tmp, 'catalog.db')
+            synthetic_database(db_file, general_rows)
+            counts = _stress(db_file, profile, readers, writers, seconds, batch_size)
+        print(
+            f"{label:>8}: {counts['reads'] / seconds:9.0f} reads/s"
+            f"  read p95 {counts['read_p95_ms']:7.1f} ms"
+            f"  {counts['writes'] / seconds:9.0f} rows written/s"
+            f"  {counts['exports']} exports"
+            f"  errors: {counts['read_errors']} read, {counts['write_errors']} write, {counts['export_errors']} export"
+        )
+
+def bench_catalog_memory(general_rows):
+    """
+    Compare the memory held by row dicts from data.json with the columnar catalog rows.
+    """
+    from catalog import GeneralRows, PersonalRows
+
+    raw = json.dumps(synthetic_catalog(general_rows))
+
+    tracemalloc.start()
+    data = json.loads(raw)
+    dict_bytes = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    del data
+
+    tracemalloc.start()
+    data = json.loads(raw)
+    personal = PersonalRows.from_rows(data['personal'])
+    general = GeneralRows.from_rows(data['general'])
+    del data
+    compact_bytes = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+
+    print(f"general rows: {general_rows}")
+    print(f"  row dicts: {dict_bytes / 1024 / 1024:8.1f} MiB")
+    print(f"  columnar:  {compact_bytes / 1024 / 1024:8.1f} MiB ({len(personal)} personal, {len(general)} general)")
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Performance benchmarks for the catalog export and Lambda.")
+    subparsers = parser.add_subparsers(dest='benchmark', required=True)
+
+    snapshot_parser = subparsers.add_parser('snapshot', help="data.json vs binary snapshot load time and RSS")
+    snapshot_parser.add_argument('--general-rows', type=int, default=200000)
+
+    export_parser = subparsers.add_parser('export', help="fetchall vs streaming JSON export time and RSS")
+    export_parser.add_argument('--general-rows', type=int, default=2000000)
+
+    stress_parser = subparsers.add_parser('db-stress', help="concurrent dashboard reads and writes, rollback journal vs WAL")
+    stress_parser.add_argument('--general-rows', type=int, default=100000)
+    stress_parser.add_argument('--readers', type=int, default=8)
+    stress_parser.add_argument('--writers', type=int, default=2)
+    stress_parser.add_argument('--seconds', type=float, default=10)
+    stress_parser.add_argument('--batch-size', type=int, default=10)
+
+    memory_parser = subparsers.add_parser('catalog-memory', help="row dicts vs columnar catalog rows")
+    memory_parser.add_argument('--general-rows', type=int, default=200000)
+
+    args = parser.parse_args()
+    if args.benchmark == 'snapshot':
+        bench_snapshot(args.general_rows)
+    elif args.benchmark == 'export':
+        bench_export(args.general_rows)
+    elif args.benchmark == 'db-stress':
+        bench_db_stress(args.general_rows, args.readers, args.writers, args.seconds, args.batch_size)
+    elif args.benchmark == 'catalog-memory':
+        bench_catalog_memory(args.general_rows)
@@ -0,0 +1,443 @@
+# catalog.py
+#
+# In-memory catalog used by the Lambda. The catalog is either a partitioned
+# export (a manifest.json plus a versioned core file and one partition per
+# language, see sqlite_to_json.py) read from a local directory or S3, or a
+# single data.snap / data.json file. Partitions of the serving export hold
+# precomputed audio buckets instead of rows.
+
+import bisect
+import hashlib
+import json
+import math
+import os
+import random
+import shutil
+import sys
+import threading
+import time
+from array import array
+from metrics import timed
+from snapshot import open_snapshot
+
+MANIFEST_FILE = 'manifest.json'
+
+# Small integer codes for the enumerated columns of the schema
+GENDERS = ('male', 'female')
+MESSAGE_TYPES = ('greeting', 'morning', 'day', 'evening', 'night')
+GENDER_CODES = {gender: code for code, gender in enumerate(GENDERS)}
+MESSAGE_TYPE_CODES = {message_type: code for code, message_type in enumerate(MESSAGE_TYPES)}
+UNKNOWN_CODE = 255
+MISSING_ID = -1
+
+def read_catalog_file(path):
+    """
+    Read a catalog file, memory-mapping binary snapshots.
+    """
+    if path.endswith('.snap'):
+        return open_snapshot(path)
+    with open(path, 'r', encoding='utf-8') as f:
+        return json.load(f)
+
+def _column(rows, name):
+    # An empty table may have been written without any columns
+    if not len(rows):
+        return []
+    # Snapshot tables decode one column without materializing whole rows
+    if hasattr(rows, 'column'):
+        return rows.column(name)
+    return [row[name] for row in rows]
+
+def _intern(value):
+    return sys.intern(value) if value is not None else None
+
+def _ids(values):
+    return array('q', (MISSING_ID if value is None else int(value) for value in values))
+
+class GeneralRows:
+    """
+    Columnar general rows with interned theme names and keys and a one-byte gender code.
+    """
+
+    __slots__ = ('category_id', 'theme_name', 'gender', 'audio_file')
+
+    def __init__(self, category_id, theme_name, gender, audio_file):
+        self.category_id = category_id
+        self.theme_name = theme_name
+        self.gender = gender
+        self.audio_file = audio_file
+
+    @classmethod
+    def from_rows(cls, rows):
+        if isinstance(rows, cls):
+            return rows
+        return cls(
+            _ids(_column(rows, 'category_id')),
+            [_intern(value) for value in _column(rows, 'theme_name')],
+            bytes(GENDER_CODES.get(value, UNKNOWN_CODE) for value in _column(rows, 'gender')),
+            [_intern(value) for value in _column(rows, 'audio_file')],
+        )
+
+    def take(self, indices):
+        return GeneralRows(
+            array('q', (self.category_id[i] for i in indices)),
+            [self.theme_name[i] for i in indices],
+            bytes(self.gender[i] for i in indices),
+            [self.audio_file[i] for i in indices],
+        )
+
+    def __len__(self):
+        return len(self.category_id)
+
+class PersonalRows:
+    """
+    Columnar personal rows; the message type is a one-byte code.
+    """
+
+    __slots__ = ('name_id', 'type', 'audio_file')
+
+    def __init__(self, name_id, type, audio_file):
+        self.name_id = name_id
+        self.type = type
+        self.audio_file = audio_file
+
+    @classmethod
+    def from_rows(cls, rows):
+        if isinstance(rows, cls):
+            return rows
+        return cls(
+            _ids(_column(rows, 'name_id')),
+            bytes(MESSAGE_TYPE_CODES.get(value, UNKNOWN_CODE) for value in _column(rows, 'type')),
+            [_intern(value) for value in _column(rows, 'audio_file')],
+        )
+
+    def take(self, indices):
+        return PersonalRows(
+            array('q', (self.name_id[i] for i in indices)),
+            bytes(self.type[i] for i in indices),
+            [self.audio_file[i] for i in indices],
+        )
+
+    def __len__(self):
+        return len(self.name_id)
+
+def split_partition(core, personal, general, language_id):
+    """
+    Select the personal and general rows of one language from a full catalog.
+    """
+    name_ids = {n['id'] for n in core['names'] if str(n['language_id']) == language_id}
+    category_ids = {c['id'] for c in core['categories'] if str(c['language_id']) == language_id}
+    return {
+        'personal': personal.take([i for i, name_id in enumerate(personal.name_id) if name_id in name_ids]),
+        'general': general.take([i for i, category_id in enumerate(general.category_id) if category_id in category_ids]),
+    }
+
+def build_partition_indexes(partition):
+    """
+    Index one language partition (rows or a serving export) for request-time lookups.
+    """
+    if 'buckets' in partition:
+        greeting_code = MESSAGE_TYPE_CODES['greeting']
+        return {
+            'personal_audio': {
+                (name_id, greeting_code): _intern(audio_file)
+                for name_id, audio_file in partition['greetings'].items()
+            },
+            'general_audio': {
+                (_intern(theme_name), GENDER_CODES.get(gender, UNKNOWN_CODE)): tuple(_intern(key) for key in keys)
+                for theme_name, genders in partition['buckets'].items()
+                for gender, keys in genders.items()
+            },
+        }
+
+    personal = PersonalRows.from_rows(partition['personal'])
+    general = GeneralRows.from_rows(partition['general'])
+
+    # Personal audio keyed by (name_id, type code); the first playable message wins
+    personal_audio = {}
+    for name_id, type_code, audio_file in zip(personal.name_id, personal.type, personal.audio_file):
+        if audio_file:
+            personal_audio.setdefault((str(name_id), type_code), audio_file)
+
+    # Distinct general audio keys bucketed by (theme_name, gender code)
+    general_audio = {}
+    for theme_name, gender_code, audio_file in zip(general.theme_name, general.gender, general.audio_file):
+        if audio_file:
+            general_audio.setdefault((theme_name, gender_code), {})[audio_file] = None
+
+    return {
+        'personal_audio': personal_audio,
+        'general_audio': {key: tuple(keys) for key, keys in general_audio.items()},
+    }
+
+def build_name_prefix_index(names):
+    """
+    Sorted (casefolded name, name_id) arrays per (language_id, gender) and per
+    (language_id, None) for prefix search with bisect.
+    """
+    index = {}
+    for name in names:
+        entry = (name['name'].casefold(), str(name['id']))
+        language_id = str(name['language_id'])
+        index.setdefault((language_id, name['gender']), []).append(entry)
+        index.setdefault((language_id, None), []).append(entry)
+    for entries in index.values():
+        entries.sort()
+    return index
+
+def _rotation_permutation(seed, size):
+    # An affine map i -> (a * i + b) % size is a permutation whenever gcd(a, size) == 1
+    digest = hashlib.sha256(str(seed).encode('utf-8')).digest()
+    a = int.from_bytes(digest[:8], 'little') % size or 1
+    while math.gcd(a, size) != 1:
+        a += 1
+    b = int.from_bytes(digest[8:16], 'little') % size
+    return a, b
+
+def sample_audio_keys(keys, k, seed=None, rotation=0):
+    """
+    Pick up to k distinct keys from a bucket; with a seed, rotation selects the next non-repeating window.
+    """
+    size = len(keys)
+    k = min(k, size)
+    if seed is None:
+        picked = {}
+        while len(picked) < k:
+            picked.setdefault(random.randrange(size), None)
+        return [keys[index] for index in picked]
+
+    # An empty (or unknown) bucket has no permutation to walk
+    if size == 0:
+        return []
+    a, b = _rotation_permutation(seed, size)
+    start = rotation * k
+    return [keys[(a * ((start + i) % size) + b) % size] for i in range(k)]
+
+class Catalog:
+    """
+    Core tables plus language partitions that are loaded on first use.
+    """
+
+    def __init__(self, core, load_partition, version=None, size_bytes=0):
+        self.core = core
+        self.version = version
+        self.size_bytes = size_bytes
+        self.names_by_id = {str(name['id']): name for name in core['names']}
+        self.name_prefix_index = build_name_prefix_index(self.names_by_id.values())
+        self._load_partition = load_partition
+        self._partitions = {}
+        self._cache = {}
+        self._lock = threading.RLock()
+
+    def topics(self):
+        """
+        Distinct theme names in first-seen order.
+        """
+        return [topic['theme_name'] for topic in self.core['topics']]
+
+    def partition(self, language_id):
+        """
+        Return the indexes for a language, loading its partition the first time.
+        """
+        language_id = str(language_id)
+        partition = self._partitions.get(language_id)
+        if partition is None:
+            # Concurrent requests (see server.py) wait for one load instead of repeating it
+            with self._lock:
+                partition = self._partitions.get(language_id)
+                if partition is None:
+                    with timed('snapshot_load'):
+                        partition = build_partition_indexes(self._load_partition(language_id))
+                    self._partitions[language_id] = partition
+        return partition
+
+    def search_names(self, language_id, prefix, gender=None, limit=10):
+        """
+        Up to `limit` names of a language (and gender) starting with prefix, case-insensitively.
+        """
+        entries = self.name_prefix_index.get((str(language_id), gender), [])
+        prefix = prefix.casefold()
+        matches = []
+        for position in range(bisect.bisect_left(entries, (prefix,)), len(entries)):
+            key, name_id = entries[position]
+            if not key.startswith(prefix) or len(matches) >= limit:
+                break
+            matches.append(self.names_by_id[name_id])
+        return matches
+
+    def loaded_partitions(self):
+        return list(self._partitions)
+
+    def cached(self, key, build):
+        """
+        Memoize a value derived from this catalog, e.g. a serialized response.
+        """
+        if key not in self._cache:
+            with self._lock:
+                if key not in self._cache:
+                    self._cache[key] = build(self)
+        return self._cache[key]
+
+class LocalCatalogSource:
+    """
+    Partitioned export in a local directory.
+    """
+
+    def __init__(self, directory):
+        self.directory = directory
+
+    def read_manifest(self):
+        manifest_file = os.path.join(self.directory, MANIFEST_FILE)
+        if not os.path.exists(manifest_file):
+            return None
+        with open(manifest_file, 'r', encoding='utf-8') as f:
+            return json.load(f)
+
+    def fetch(self, file_name):
+        return os.path.join(self.directory, file_name)
+
+    def discard(self, version):
+        # The exporter removes old versions from the export directory itself
+        pass
+
+class S3CatalogSource:
+    """
+    Partitioned export under an S3 prefix; files are downloaded to a local cache directory.
+    """
+
+    def __init__(self, s3_client, bucket, prefix, cache_dir='/tmp/catalog'):
+        self.s3_client = s3_client
+        self.bucket = bucket
+        self.prefix = prefix.strip('/')
+        self.cache_dir = cache_dir
+
+    def _key(self, file_name):
+        return f"{self.prefix}/{file_name}" if self.prefix else file_name
+
+    def read_manifest(self):
+        try:
+            response = self.s3_client.get_object(Bucket=self.bucket, Key=self._key(MANIFEST_FILE))
+        except self.s3_client.exceptions.NoSuchKey:
+            return None
+        return json.loads(response['Body'].read())
+
+    def fetch(self, file_name):
+        # Exported file names are versioned, so a cached download never goes stale
+        path = os.path.join(self.cache_dir, file_name)
+        if not os.path.exists(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            try:
+                self.s3_client.download_file(self.bucket, self._key(file_name), path + '.part')
+            except self.s3_client.exceptions.ClientError as e:
+                if e.response.get('Error', {}).get('Code') in ('404', 'NoSuchKey', 'NotFound'):
+                    raise FileNotFoundError(self._key(file_name)) from e
+                raise
+            os.replace(path + '.part', path)
+        return path
+
+    def discard(self, version):
+        """
+        Remove the cached files of a version that is no longer served.
+        """
+        shutil.rmtree(os.path.join(self.cache_dir, version), ignore_errors=True)
+
+def catalog_from_manifest(source, manifest):
+    """
+    Open the core of a partitioned export; partitions are fetched when first used.
+    """
+    core_file = source.fetch(manifest['core'])
+    partitions = manifest['partitions']
+
+    def read_partition(file_name):
+        if file_name is None:
+            return {'personal': [], 'general': []}
+        partition_file = source.fetch(file_name)
+        catalog.size_bytes += os.path.getsize(partition_file)
+        return read_catalog_file(partition_file)
+
+    def load_partition(language_id):
+        try:
+            return read_partition(partitions.get(language_id))
+        except FileNotFoundError:
+            # This version was pruned after newer ones were published; serve the
+            # current manifest's partition until the reloader swaps catalogs
+            current = source.read_manifest() or {}
+            return read_partition(current.get('partitions', {}).get(language_id))
+
+    catalog = Catalog(
+        read_catalog_file(core_file), load_partition,
+        version=manifest.get('version'), size_bytes=os.path.getsize(core_file),
+    )
+    return catalog
+
+def load_catalog(source, snapshot_file, json_file):
+    """
+    Open the partitioned export from source, or fall back to a single catalog file.
+    """
+    manifest = source.read_manifest() if source else None
+    if manifest:
+        return catalog_from_manifest(source, manifest)
+
+    # Keep the small reference tables as rows and convert the large message
+    # tables to columns, so the row dicts of data.json can be freed
+    catalog_file = snapshot_file if os.path.exists(snapshot_file) else json_file
+    data = read_catalog_file(catalog_file)
+    personal = PersonalRows.from_rows(data['personal'])
+    general = GeneralRows.from_rows(data['general'])
+    core = {table: data[table] for table in ('languages', 'voices', 'names', 'categories')}
+    core['topics'] = [{'theme_name': theme_name} for theme_name in dict.fromkeys(general.theme_name)]
+    del data
+    return Catalog(
+        core, lambda language_id: split_partition(core, personal, general, language_id),
+        size_bytes=os.path.getsize(catalog_file),
+    )
+
+class CatalogReloader:
+    """
+    Serve a catalog and swap in newer manifest versions, checked in the background every check_interval seconds.
+    """
+
+    def __init__(self, source, snapshot_file, json_file, check_interval=60, clock=time.monotonic):
+        self.source = source
+        self.check_interval = check_interval
+        self._clock = clock
+        self._catalog = load_catalog(source, snapshot_file, json_file)
+        self._last_check = clock()
+        self._lock = threading.Lock()
+        self._thread = None
+        self.reloads = 0
+
+    def current(self):
+        if self.source is not None and self._clock() - self._last_check >= self.check_interval:
+            with self._lock:
+                if self._thread is None and self._clock() - self._last_check >= self.check_interval:
+                    self._last_check = self._clock()
+                    self._thread = threading.Thread(target=self._reload, daemon=True)
+                    self._thread.start()
+        return self._catalog
+
+    def reload(self):
+        """
+        Check for a new version synchronously; returns True when the catalog was swapped.
+        """
+        manifest = self.source.read_manifest()
+        if not manifest or manifest.get('version') == self._catalog.version:
+            return False
+        catalog = catalog_from_manifest(self.source, manifest)
+        previous = self._catalog
+        for language_id in previous.loaded_partitions():
+            catalog.partition(language_id)
+        self._catalog = catalog
+        self.reloads += 1
+        # A request still holding the old catalog fetches a removed file again
+        if previous.version:
+            self.source.discard(previous.version)
+        return True
+
+    def _reload(self):
+        try:
+            self.reload()
+        except Exception as e:
+            print(f"Catalog reload failed, keeping version {self._catalog.version}: {e}")
+        finally:
+            self._thread = None
@@ -0,0 +1,68 @@
+# compression.py
+#
+# Content-Encoding negotiation for Lambda responses. Compressed bodies are
+# returned base64-encoded with isBase64Encoded, as API Gateway requires.
+# Brotli is used when the optional `brotli` package is installed.
+
+import base64
+import gzip
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+# Preference order when a client accepts several encodings
+SUPPORTED_ENCODINGS = ['br', 'gzip'] if brotli is not None else ['gzip']
+
+def choose_encoding(accept_encoding):
+    """
+    Pick the best supported encoding from an Accept-Encoding header, or None.
+    """
+    if not accept_encoding:
+        return None
+    accepted = {}
+    for part in accept_encoding.split(','):
+        coding, _, params = part.strip().partition(';')
+        quality = 1.0
+        params = params.strip()
+        if params.startswith('q='):
+            try:
+                quality = float(params[2:])
+            except ValueError:
+                quality = 0.0
+        accepted[coding.strip().lower()] = quality
+    for encoding in SUPPORTED_ENCODINGS:
+        if accepted.get(encoding, accepted.get('*', 0.0)) > 0:
+            return encoding
+    return None
+
+def compress(body, encoding, best=False):
+    """
+    Compress a str/bytes body. `best` trades CPU for size, for bodies compressed once and cached.
+    """
+    if isinstance(body, str):
+        body = body.encode('utf-8')
+    if encoding == 'br':
+        return brotli.compress(body, quality=11 if best else 5)
+    if encoding == 'gzip':
+        return gzip.compress(body, compresslevel=9 if best else 6, mtime=0)
+    raise ValueError(f"Unsupported encoding {encoding}")
+
+def encode_response(response, encoding, min_bytes=1024):
+    """
+    Compress a response body in place when the client accepts it and it is worth it.
+    """
+    if response.get('isBase64Encoded') or 'Content-Encoding' in response.get('headers', {}):
+        return response
+    body = response.get('body') or ''
+    if encoding is None or len(body) < min_bytes:
+        return response
+    headers = dict(response.get('headers') or {})
+    headers['Content-Encoding'] = encoding
+    headers['Vary'] = 'Accept-Encoding'
+    response = dict(response)
+    response['headers'] = headers
+    response['body'] = base64.b64encode(compress(body, encoding)).decode('ascii')
+    response['isBase64Encoded'] = True
+    return response
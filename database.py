@@ -1,19 +1,170 @@
+import contextvars
+import math
+import os
+import re
 import sqlite3
-from contextlib import closing
+import threading
+import time
+from collections import namedtuple
+from contextlib import closing, contextmanager, nullcontext
 
-def create_connection(db_file):
+# Tables whose changes are recorded in change_log
+TRACKED_TABLES = ['language', 'voice', 'name', 'category', 'personal', 'general']
+
+# PRAGMAs applied to every connection. WAL lets readers (other dashboard
+# sessions, the exporter) continue while one writer commits, and writers
+# wait up to busy_timeout ms for each other instead of failing.
+CONNECTION_PROFILE = {
+    'journal_mode': os.environ.get('DB_JOURNAL_MODE', 'WAL'),
+    'synchronous': os.environ.get('DB_SYNCHRONOUS', 'NORMAL'),
+    'busy_timeout': int(os.environ.get('DB_BUSY_TIMEOUT_MS', '10000')),
+    'mmap_size': int(os.environ.get('DB_MMAP_SIZE', str(256 * 1024 * 1024))),
+    'cache_size': int(os.environ.get('DB_CACHE_SIZE', '-65536')),  # Negative: KiB
+    'foreign_keys': os.environ.get('DB_FOREIGN_KEYS', 'ON'),
+}
+
+# Opt-in per-rerun query log (see query_log); queries slower than
+# DB_SLOW_QUERY_MS are printed with their query plan
+QUERY_LOG_ENABLED = os.environ.get('DB_QUERY_LOG', '0') == '1'
+SLOW_QUERY_MS = float(os.environ.get('DB_SLOW_QUERY_MS', '50'))
+
+def apply_connection_profile(conn, profile=CONNECTION_PROFILE):
+    for pragma, value in profile.items():
+        conn.execute(f"PRAGMA {pragma} = {value}")
+
+def create_connection(db_file, profile=CONNECTION_PROFILE):
     """
     Create a database connection to the SQLite database.
     """
     conn = sqlite3.connect(db_file)
+    try:
+        apply_connection_profile(conn, profile)
+    except sqlite3.Error:
+        conn.close()
+        raise
     return conn
 
-def create_tables(conn):
+class SharedConnection(sqlite3.Connection):
     """
-    Create tables in the SQLite database.
+    Connection shared by all threads of a process; the helpers below hold
+    `lock` while they use it so statements of different sessions don't interleave.
     """
-    cursor = conn.cursor()
 
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.lock = threading.RLock()
+        self.reference_cache = ReferenceCache()
+
+_shared_connections = {}
+_shared_connections_lock = threading.Lock()
+
+def get_connection(db_file):
+    """
+    Return the process-wide connection to db_file, migrating the schema on first use.
+    """
+    with _shared_connections_lock:
+        conn = _shared_connections.get(db_file)
+        if conn is None:
+            conn = sqlite3.connect(db_file, check_same_thread=False, factory=SharedConnection)
+            apply_connection_profile(conn)
+            migrate(conn)
+            _shared_connections[db_file] = conn
+        return conn
+
+def _lock(conn):
+    return getattr(conn, 'lock', None) or nullcontext()
+
+_writer_locks = {}
+_writer_locks_lock = threading.Lock()
+
+def _writer_lock(conn):
+    # One lock per database file, so writers in this process queue up here
+    # instead of polling SQLite's lock until busy_timeout
+    db_file = conn.execute("PRAGMA database_list").fetchone()[2]
+    with _writer_locks_lock:
+        return _writer_locks.setdefault(db_file, threading.Lock())
+
+# Table written by an INSERT/UPDATE/DELETE/REPLACE statement
+_WRITTEN_TABLE = re.compile(
+    r'^\s*(?:INSERT(?:\s+OR\s+\w+)?\s+INTO|REPLACE\s+INTO|UPDATE(?:\s+OR\s+\w+)?|DELETE\s+FROM)\s+["`\[]?(\w+)',
+    re.IGNORECASE,
+)
+
+class ReferenceCache:
+    """
+    Read-through cache of the reference tables of a shared connection, dropped on writes and PRAGMA data_version changes.
+    """
+
+    QUERIES = {
+        'languages': "SELECT id, name, code FROM language ORDER BY id",
+        'voices': "SELECT id, name, elevenlabs_voice_id, gender, language_id FROM voice ORDER BY id",
+        'category_languages': "SELECT id, language_id FROM category",
+    }
+    TABLE_KEYS = {'language': 'languages', 'voice': 'voices', 'category': 'category_languages'}
+
+    def __init__(self):
+        self._entries = {}
+        self._data_version = None
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+
+    def get(self, conn, key):
+        with _lock(conn):
+            data_version = conn.execute("PRAGMA data_version").fetchone()[0]
+            if data_version != self._data_version:
+                self.invalidate()
+                self._data_version = data_version
+            if key in self._entries:
+                self.hits += 1
+                return self._entries[key]
+            self.misses += 1
+            value = fetch_all(conn, self.QUERIES[key])
+            if key == 'category_languages':
+                value = dict(value)
+            self._entries[key] = value
+            return value
+
+    def invalidate(self, table=None):
+        """
+        Drop the entry of a table, or every entry when table is None.
+        """
+        keys = list(self._entries) if table is None else [self.TABLE_KEYS.get(table.lower())]
+        for key in keys:
+            if self._entries.pop(key, None) is not None:
+                self.invalidations += 1
+
+    def stats(self):
+        return {'hits': self.hits, 'misses': self.misses, 'invalidations': self.invalidations}
+
+def _invalidate_reference_cache(conn, query):
+    # Statements other than INSERT/UPDATE/DELETE (DDL, PRAGMA) drop everything
+    cache = getattr(conn, 'reference_cache', None)
+    if cache is not None:
+        match = _WRITTEN_TABLE.match(query)
+        cache.invalidate(match.group(1) if match else None)
+
+@contextmanager
+def write_transaction(conn, table=None):
+    """
+    Run the enclosed writes as one BEGIN IMMEDIATE transaction, serialized with every other writer.
+    """
+    with _lock(conn), _writer_lock(conn), closing(conn.cursor()) as cursor:
+        cursor.execute("BEGIN IMMEDIATE")
+        try:
+            yield cursor
+        except BaseException:
+            conn.rollback()
+            raise
+        conn.commit()
+    cache = getattr(conn, 'reference_cache', None)
+    if cache is not None:
+        cache.invalidate(table)
+
+def _create_catalog_tables(cursor):
+    """
+    Version 1: the catalog tables.
+    """
     # Voice Table
     cursor.execute('''
         CREATE TABLE IF NOT EXISTS voice (
@@ -86,28 +237,433 @@ def create_tables(conn):
         )
     ''')
 
-    conn.commit()
+def _create_change_log(cursor):
+    """
+    Version 2: change log fed by triggers, for incremental exports (see sqlite_to_json.py).
+    """
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS change_log (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            table_name TEXT NOT NULL,
+            row_id INTEGER NOT NULL,
+            operation TEXT CHECK(operation IN ('insert', 'update', 'delete')) NOT NULL,
+            changed_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+    ''')
+    for table in TRACKED_TABLES:
+        for operation, row in [('insert', 'NEW'), ('update', 'NEW'), ('delete', 'OLD')]:
+            cursor.execute(f'''
+                CREATE TRIGGER IF NOT EXISTS {table}_{operation}_change
+                AFTER {operation.upper()} ON {table}
+                BEGIN
+                    INSERT INTO change_log (table_name, row_id, operation)
+                    VALUES ('{table}', {row}.id, '{operation}');
+                END
+            ''')
+
+def _create_indexes(cursor):
+    """
+    Version 3: indexes for the dashboard's and the exporter's lookups.
+    """
+    # Themes of a category, topics of a theme and text counts per gender
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_general_category_theme_gender ON general(category_id, theme_name, gender)")
+    # Distinct theme names across all categories
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_general_theme ON general(theme_name)")
+    # Messages of a name, by type
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_personal_name_type ON personal(name_id, type)")
+    # Voice for a language and gender, covering the ElevenLabs id
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_voice_language_gender ON voice(language_id, gender, elevenlabs_voice_id)")
+    # Names of a language
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_name_language ON name(language_id)")
+
+def _create_name_sort_indexes(cursor):
+    """
+    Version 4: indexes for the keyset-paginated name list, sorted by name.
+    """
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_name_name ON name(name)")
+    # Also serves the names-of-a-language lookups of idx_name_language
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_name_language_name ON name(language_id, name)")
+    cursor.execute("DROP INDEX IF EXISTS idx_name_language")
+
+# Schema migrations as (version, function); the applied version is stored in PRAGMA user_version
+MIGRATIONS = [
+    (1, _create_catalog_tables),
+    (2, _create_change_log),
+    (3, _create_indexes),
+    (4, _create_name_sort_indexes),
+]
+
+# Frequent queries, with sample parameters and the index that must answer them
+HOT_QUERIES = [
+    (
+        "SELECT DISTINCT theme_name FROM general WHERE category_id = ?", (1,),
+        'idx_general_category_theme_gender',
+    ),
+    (
+        "SELECT * FROM general WHERE category_id = ? AND theme_name = ?", (1, 'theme'),
+        'idx_general_category_theme_gender',
+    ),
+    (
+        "SELECT COUNT(*) FROM general WHERE category_id = ? AND theme_name = ? AND gender = ? AND text IS NOT NULL",
+        (1, 'theme', 'male'),
+        'idx_general_category_theme_gender',
+    ),
+    ("SELECT DISTINCT theme_name FROM general", (), 'idx_general_theme'),
+    ("SELECT theme_name FROM general GROUP BY theme_name ORDER BY MIN(id)", (), 'idx_general_theme'),
+    ("SELECT id, type, text, audio_file FROM personal WHERE name_id = ?", (1,), 'idx_personal_name_type'),
+    (
+        "UPDATE personal SET audio_file = ? WHERE name_id = ? AND type = ?", ('file.mp3', 1, 'greeting'),
+        'idx_personal_name_type',
+    ),
+    ("SELECT voice.id FROM voice WHERE language_id = ? AND gender = ?", (1, 'male'), 'idx_voice_language_gender'),
+    (
+        "SELECT elevenlabs_voice_id FROM voice WHERE language_id = ? AND gender = ? LIMIT 1", (1, 'male'),
+        'idx_voice_language_gender',
+    ),
+    ("SELECT id FROM name WHERE language_id = ?", (1,), 'idx_name_language_name'),
+    (
+        "SELECT name.id, name.name FROM name JOIN language ON name.language_id = language.id"
+        " WHERE (name.name, name.id) > (?, ?) ORDER BY name.name, name.id LIMIT ?",
+        ('name', 1, 51),
+        'idx_name_name',
+    ),
+    (
+        "SELECT name.id, name.name FROM name JOIN language ON name.language_id = language.id"
+        " WHERE name.language_id = ? AND (name.name, name.id) > (?, ?) ORDER BY name.name, name.id LIMIT ?",
+        (1, 'name', 1, 51),
+        'idx_name_language_name',
+    ),
+]
+
+def schema_version(conn):
+    return conn.execute("PRAGMA user_version").fetchone()[0]
+
+def migrate(conn):
+    """
+    Apply the pending schema migrations, each in its own transaction.
+    """
+    with _lock(conn):
+        for version, migration in MIGRATIONS:
+            if version <= schema_version(conn):
+                continue
+            cursor = conn.cursor()
+            try:
+                cursor.execute("BEGIN")
+                migration(cursor)
+                cursor.execute(f"PRAGMA user_version = {version}")
+                conn.commit()
+            except Exception:
+                conn.rollback()
+                raise
+            finally:
+                cursor.close()
+
+def explain_query_plan(conn, query, params=()):
+    """
+    Return the EXPLAIN QUERY PLAN detail lines of a query.
+    """
+    with _lock(conn), closing(conn.cursor()) as cursor:
+        cursor.execute(f"EXPLAIN QUERY PLAN {query}", params)
+        return [row[3] for row in cursor.fetchall()]
+
+def check_query_plans(conn, queries=HOT_QUERIES):
+    """
+    Return (query, plan) for every query in `queries` whose plan does not use its index.
+    """
+    failures = []
+    for query, params, index in queries:
+        plan = explain_query_plan(conn, query, params)
+        if not any(f"INDEX {index}" in detail for detail in plan):
+            failures.append((query, plan))
+    return failures
+
+def create_tables(conn):
+    """
+    Create the tables in the SQLite database, or upgrade them to the latest schema.
+    """
+    migrate(conn)
+
+class QueryLog:
+    """
+    Queries run through the helpers below during one unit of work, e.g. a Streamlit rerun.
+    """
+
+    def __init__(self, slow_query_ms=SLOW_QUERY_MS):
+        self.slow_query_ms = slow_query_ms
+        self.entries = []
+
+    def add(self, query, params_shape, rows, milliseconds):
+        self.entries.append({
+            'query': ' '.join(query.split()),
+            'params': params_shape,
+            'rows': rows,
+            'ms': milliseconds,
+        })
+
+    def total_ms(self):
+        return sum(entry['ms'] for entry in self.entries)
+
+    def summary(self):
+        """
+        Count, rows and latency per distinct query text, slowest total first.
+        """
+        queries = {}
+        for entry in self.entries:
+            stats = queries.setdefault(entry['query'], {'query': entry['query'], 'count': 0, 'rows': 0, 'total_ms': 0.0, 'max_ms': 0.0})
+            stats['count'] += 1
+            stats['rows'] += entry['rows']
+            stats['total_ms'] += entry['ms']
+            stats['max_ms'] = max(stats['max_ms'], entry['ms'])
+        return sorted(queries.values(), key=lambda stats: stats['total_ms'], reverse=True)
+
+_current_query_log = contextvars.ContextVar('query_log', default=None)
+
+@contextmanager
+def query_log(slow_query_ms=SLOW_QUERY_MS):
+    """
+    Record the queries of the enclosed block into a QueryLog.
+    """
+    log = QueryLog(slow_query_ms)
+    token = _current_query_log.set(log)
+    try:
+        yield log
+    finally:
+        _current_query_log.reset(token)
+
+def _params_shape(params):
+    # Types only, so logged entries never contain user data
+    if isinstance(params, dict):
+        return '{' + ', '.join(f"{key}: {type(value).__name__}" for key, value in params.items()) + '}'
+    return '(' + ', '.join(type(value).__name__ for value in params) + ')'
+
+def _record_query(conn, log, query, params, params_shape, started, rows):
+    milliseconds = (time.perf_counter() - started) * 1000
+    log.add(query, params_shape, rows, milliseconds)
+    if milliseconds >= log.slow_query_ms:
+        plan = explain_query_plan(conn, query, params)
+        print(f"Slow query ({milliseconds:.1f} ms, {rows} rows): {' '.join(query.split())}\n  plan: {'; '.join(plan)}")
+
+def prune_change_log(conn, up_to_change_id):
+    """
+    Delete change log entries that every consumer has already exported.
+    """
+    execute_query(conn, "DELETE FROM change_log WHERE id <= ?", (up_to_change_id,))
 
 def execute_query(conn, query, params=()):
     """
     Execute a SQL query with optional parameters.
     """
-    with closing(conn.cursor()) as cursor:
-        cursor.execute(query, params)
+    log = _current_query_log.get()
+    started = time.perf_counter()
+    with _lock(conn), closing(conn.cursor()) as cursor:
+        try:
+            cursor.execute(query, params)
+        except sqlite3.Error:
+            # Release the write lock the failed statement may have taken
+            conn.rollback()
+            raise
         conn.commit()
+        _invalidate_reference_cache(conn, query)
+        if log is not None:
+            _record_query(conn, log, query, params, _params_shape(params), started, max(cursor.rowcount, 0))
+
+# Outcome of execute_batch: rows changed, indices of rows that changed
+# nothing (e.g. skipped by ON CONFLICT DO NOTHING) and (index, error) of
+# rows that violated a constraint or could not be bound
+BatchResult = namedtuple('BatchResult', ['changed', 'skipped', 'failed'])
+
+def execute_batch(conn, query, rows):
+    """
+    Execute a statement for every row of parameters in one transaction, reporting skipped and failed rows.
+    """
+    rows = [_bindable_row(params) for params in rows]
+    log = _current_query_log.get()
+    started = time.perf_counter()
+    result = _execute_batch(conn, query, rows)
+    if log is not None and rows:
+        params_shape = f"{len(rows)} x {_params_shape(rows[0])}"
+        _record_query(conn, log, query, rows[0], params_shape, started, result.changed)
+    return result
+
+def _bindable(value):
+    # CSV imports hand over numpy scalars, and NaN or NA for empty cells
+    if type(value).__module__ == 'numpy' and hasattr(value, 'item'):
+        value = value.item()
+    if isinstance(value, float) and math.isnan(value):
+        return None
+    if type(value).__name__ in ('NAType', 'NaTType'):
+        return None
+    return value
+
+def _bindable_row(params):
+    if isinstance(params, dict):
+        return {key: _bindable(value) for key, value in params.items()}
+    return tuple(_bindable(value) for value in params)
+
+def _execute_batch(conn, query, rows):
+    match = _WRITTEN_TABLE.match(query)
+    with write_transaction(conn, table=match.group(1) if match else None) as cursor:
+        cursor.execute("SAVEPOINT batch")
+        try:
+            cursor.executemany(query, rows)
+            if cursor.rowcount == len(rows):
+                cursor.execute("RELEASE batch")
+                return BatchResult(len(rows), [], [])
+        except sqlite3.Error:
+            pass
+        cursor.execute("ROLLBACK TO batch")
+        cursor.execute("RELEASE batch")
+
+        changed, skipped, failed = 0, [], []
+        for index, params in enumerate(rows):
+            try:
+                cursor.execute(query, params)
+            except sqlite3.Error as e:
+                failed.append((index, str(e)))
+                continue
+            if cursor.rowcount > 0:
+                changed += cursor.rowcount
+            else:
+                skipped.append(index)
+        return BatchResult(changed, skipped, failed)
 
 def fetch_all(conn, query, params=()):
     """
     Fetch all results from a SQL query.
     """
-    with closing(conn.cursor()) as cursor:
+    log = _current_query_log.get()
+    started = time.perf_counter()
+    with _lock(conn), closing(conn.cursor()) as cursor:
         cursor.execute(query, params)
-        return cursor.fetchall()
+        rows = cursor.fetchall()
+        if log is not None:
+            _record_query(conn, log, query, params, _params_shape(params), started, len(rows))
+        return rows
 
 def fetch_one(conn, query, params=()):
     """
     Fetch one result from a SQL query.
     """
-    with closing(conn.cursor()) as cursor:
+    log = _current_query_log.get()
+    started = time.perf_counter()
+    with _lock(conn), closing(conn.cursor()) as cursor:
         cursor.execute(query, params)
-        return cursor.fetchone()
+        row = cursor.fetchone()
+        if log is not None:
+            _record_query(conn, log, query, params, _params_shape(params), started, int(row is not None))
+        return row
+
+def fetch_page(conn, columns, from_clause, id_column, sort_column, where=(), params=(),
+               after=None, descending=False, page_size=50):
+    """
+    Fetch one keyset page ordered by (sort_column, id_column) after `after`; returns (rows, next after or None).
+    """
+    conditions = list(where)
+    params = list(params)
+    if after is not None:
+        conditions.append(f"({sort_column}, {id_column}) {'<' if descending else '>'} (?, ?)")
+        params.extend(after)
+    direction = 'DESC' if descending else 'ASC'
+    query = f"SELECT {', '.join(columns)}, {sort_column}, {id_column} FROM {from_clause}"
+    if conditions:
+        query += " WHERE " + " AND ".join(f"({condition})" for condition in conditions)
+    query += f" ORDER BY {sort_column} {direction}, {id_column} {direction} LIMIT ?"
+    rows = fetch_all(conn, query, params + [page_size + 1])
+    next_after = tuple(rows[page_size - 1][-2:]) if len(rows) > page_size else None
+    return [row[:-2] for row in rows[:page_size]], next_after
+
+# Tables whose rows reference a row of another table, as (table, column),
+# deleted together with it by delete_cascade
+CHILD_TABLES = {
+    'language': [('voice', 'language_id'), ('name', 'language_id'), ('category', 'language_id')],
+    'name': [('personal', 'name_id')],
+    'category': [('general', 'category_id')],
+}
+
+def _cascade(table, condition):
+    # (table, WHERE condition) of the rows to delete, children before their parents
+    statements = []
+    for child, column in CHILD_TABLES.get(table, []):
+        statements.extend(_cascade(child, f"{column} IN (SELECT id FROM {table} WHERE {condition})"))
+    statements.append((table, condition))
+    return statements
+
+def count_dependents(conn, table, row_id):
+    """
+    Rows that delete_cascade would delete along with a row, as {table: count}.
+    """
+    counts = {}
+    for child, condition in _cascade(table, "id = ?")[:-1]:
+        count = fetch_one(conn, f"SELECT COUNT(*) FROM {child} WHERE {condition}", (row_id,))[0]
+        if count:
+            counts[child] = count
+    return counts
+
+def delete_cascade(conn, table, row_id):
+    """
+    Delete a row and every row referencing it, directly or indirectly, in one transaction.
+    """
+    with write_transaction(conn) as cursor:
+        for child, condition in _cascade(table, "id = ?"):
+            cursor.execute(f"DELETE FROM {child} WHERE {condition}", (row_id,))
+
+def _reference_rows(conn, key):
+    cache = getattr(conn, 'reference_cache', None)
+    if cache is None:
+        rows = fetch_all(conn, ReferenceCache.QUERIES[key])
+        return dict(rows) if key == 'category_languages' else rows
+    return cache.get(conn, key)
+
+def get_languages(conn):
+    """
+    All languages as (id, name, code) rows, from the reference cache.
+    """
+    return _reference_rows(conn, 'languages')
+
+def get_language(conn, language_id):
+    """
+    The (id, name, code) row of a language, or None.
+    """
+    return next((language for language in get_languages(conn) if language[0] == language_id), None)
+
+def get_voices(conn):
+    """
+    All voices as (id, name, elevenlabs_voice_id, gender, language_id) rows, from the reference cache.
+    """
+    return _reference_rows(conn, 'voices')
+
+def find_voice_id(conn, language_id, gender):
+    """
+    The ElevenLabs voice ID of the first voice for a language and gender, or None.
+    """
+    return next(
+        (voice[2] for voice in get_voices(conn) if voice[4] == language_id and voice[3] == gender),
+        None,
+    )
+
+def get_category_language_id(conn, category_id):
+    """
+    The language_id of a category, or None.
+    """
+    return _reference_rows(conn, 'category_languages').get(category_id)
+
+def reference_cache_stats(conn):
+    cache = getattr(conn, 'reference_cache', None)
+    return cache.stats() if cache is not None else None
+
+if __name__ == '__main__':
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Migrate the dashboard database and check the hot query plans.")
+    parser.add_argument('db_file', nargs='?', default='mydatabase.db')
+    args = parser.parse_args()
+
+    conn = create_connection(args.db_file)
+    migrate(conn)
+    print(f"Schema version {schema_version(conn)}")
+    failures = check_query_plans(conn)
+    for query, plan in failures:
+        print(f"Not using its index: {query}\n  {'; '.join(plan)}")
+    conn.close()
+    if failures:
+        raise SystemExit(1)
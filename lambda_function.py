@@ -1,46 +1,183 @@
 # lambda_function.py
 
+import base64
 import json
-import random
 import boto3
+import hashlib
 import os
+import time
+import metrics
+from compression import choose_encoding, compress, encode_response
+from catalog import (
+    GENDER_CODES, MESSAGE_TYPE_CODES, CatalogReloader, LocalCatalogSource, S3CatalogSource, sample_audio_keys,
+)
+from presigned_urls import PresignedUrlCache
+from stitching import StitchedAudioStore
 
-# Load the JSON data once when the Lambda function is initialized
-with open('data.json', 'r', encoding='utf-8') as f:
-    data = json.load(f)
+SNAPSHOT_FILE = os.environ.get('SNAPSHOT_FILE', 'data.snap')
+CATALOG_DIR = os.environ.get('CATALOG_DIR', 'catalog')
+CATALOG_S3_PREFIX = os.environ.get('CATALOG_S3_PREFIX')
+CATALOG_CHECK_INTERVAL = int(os.environ.get('CATALOG_CHECK_INTERVAL', '60'))
+OPTIONS_MAX_AGE = int(os.environ.get('OPTIONS_MAX_AGE', '300'))
+NAME_SEARCH_MAX_LIMIT = 50
+BATCH_MAX_SIZE = int(os.environ.get('BATCH_MAX_SIZE', '20'))
+COMPRESSION_MIN_BYTES = int(os.environ.get('COMPRESSION_MIN_BYTES', '1024'))
+STITCHED_AUDIO_PREFIX = os.environ.get('STITCHED_AUDIO_PREFIX', 'stitched/')
+STITCH_CACHE_DIR = os.environ.get('STITCH_CACHE_DIR', '/tmp/stitched')
+STITCH_CACHE_MAX_BYTES = int(os.environ.get('STITCH_CACHE_MAX_BYTES', str(128 * 1024 * 1024)))
+PRESIGNED_URL_EXPIRES_IN = 3600
+PRESIGNED_URL_REFRESH_MARGIN = int(os.environ.get('PRESIGNED_URL_REFRESH_MARGIN', '900'))
+PRESIGNED_URL_CACHE_SIZE = int(os.environ.get('PRESIGNED_URL_CACHE_SIZE', '10000'))
 
 # Initialize AWS S3 client
 s3_client = boto3.client('s3')
 
 AWS_S3_BUCKET_NAME = os.environ.get('AWS_S3_BUCKET_NAME')
 
-def generate_presigned_url(s3_file_name):
+# Load the catalog core once when the Lambda function is initialized; language
+# partitions are loaded on the first request that needs them and newly
+# published manifests are picked up in the background
+_load_started = time.perf_counter()
+if CATALOG_S3_PREFIX is not None:
+    catalog_source = S3CatalogSource(s3_client, AWS_S3_BUCKET_NAME, CATALOG_S3_PREFIX)
+else:
+    catalog_source = LocalCatalogSource(CATALOG_DIR)
+catalog_reloader = CatalogReloader(
+    catalog_source, SNAPSHOT_FILE, 'data.json', check_interval=CATALOG_CHECK_INTERVAL,
+)
+# Reported as the snapshot_load stage of the first (cold start) invocation
+cold_start_load_ms = (time.perf_counter() - _load_started) * 1000
+cold_start = True
+
+def sign_s3_url(s3_file_name, expires_in):
     signed_url = s3_client.generate_presigned_url(
         'get_object',
         Params={'Bucket': AWS_S3_BUCKET_NAME, 'Key': s3_file_name},
-        ExpiresIn=3600,
+        ExpiresIn=expires_in,
     )
     return signed_url
 
+# Greetings and clips are shared by many users, so reuse signatures across requests
+presigned_url_cache = PresignedUrlCache(
+    sign_s3_url,
+    expires_in=PRESIGNED_URL_EXPIRES_IN,
+    refresh_margin=PRESIGNED_URL_REFRESH_MARGIN,
+    max_size=PRESIGNED_URL_CACHE_SIZE,
+)
+
+# Stitched sessions are cached in S3 by clip-key tuple
+stitched_audio_store = StitchedAudioStore(
+    s3_client, AWS_S3_BUCKET_NAME, prefix=STITCHED_AUDIO_PREFIX, local_dir=STITCH_CACHE_DIR,
+    max_clip_bytes=STITCH_CACHE_MAX_BYTES,
+)
+
+def generate_presigned_url(s3_file_name):
+    with metrics.timed('signing'):
+        return presigned_url_cache.get(s3_file_name)
+
+def to_json(value):
+    # Compact separators and raw UTF-8 keep names and flag emojis small on the wire
+    return json.dumps(value, ensure_ascii=False, separators=(',', ':'))
+
+def is_true(value):
+    # Flags arrive as query strings ("1", "true", "false") or JSON booleans/numbers
+    return str(value).lower() in ('1', 'true')
+
+def get_header(event, name):
+    # API Gateway HTTP APIs lowercase header names, REST APIs keep them as sent
+    headers = event.get('headers') or {}
+    name = name.lower()
+    return next((value for key, value in headers.items() if key.lower() == name), None)
+
+def get_json_body(event):
+    body = event.get('body') or ''
+    try:
+        if event.get('isBase64Encoded'):
+            body = base64.b64decode(body)
+        return json.loads(body)
+    except ValueError:
+        return None
+
 def lambda_handler(event, context):
+    global cold_start
     path = event.get('rawPath')
+    with metrics.invocation(path, cold_start) as invocation:
+        if cold_start:
+            invocation.add('snapshot_load', cold_start_load_ms)
+            cold_start = False
+        encoding = choose_encoding(get_header(event, 'Accept-Encoding'))
+        response = route_request(event, path, encoding)
+        with metrics.timed('serialization'):
+            response = encode_response(response, encoding, COMPRESSION_MIN_BYTES)
+        catalog = catalog_reloader.current()
+        invocation.properties.update({
+            'StatusCode': response.get('statusCode'),
+            'SnapshotVersion': catalog.version,
+            'SnapshotBytes': catalog.size_bytes,
+            'PresignedUrlCacheHits': presigned_url_cache.hits,
+            'PresignedUrlCacheMisses': presigned_url_cache.misses,
+        })
+    return response
+
+def route_request(event, path, encoding=None):
     if path == '/options':
-        return get_options()
+        # includeNames=false leaves nameOptions empty; clients then use /searchNames
+        params = event.get('queryStringParameters') or {}
+        include_names = params.get('includeNames', 'true').lower() != 'false'
+        return get_options(get_header(event, 'If-None-Match'), include_names=include_names, encoding=encoding)
+    elif path == '/searchNames':
+        params = event.get('queryStringParameters') or {}
+        limit = params.get('limit', '10')
+        if not limit.isdigit():
+            return {
+                'statusCode': 400,
+                'body': to_json({'message': 'Invalid limit'}),
+            }
+        return search_names(
+            params.get('languageId'), params.get('prefix', ''), params.get('gender'), int(limit),
+        )
     elif path == '/simulateAPICall':
         # Extract query parameters
-        params = event.get('queryStringParameters', {})
+        params = event.get('queryStringParameters') or {}
         selectedVoice = params.get('selectedVoice')
         selectedLanguage = params.get('selectedLanguage')
         selectedName = params.get('selectedName')
         selectedTopic = params.get('selectedTopic')
-        return simulate_api_call(selectedVoice, selectedLanguage, selectedName, selectedTopic)
+        rotation = params.get('rotation', '0')
+        if not rotation.isdigit():
+            return {
+                'statusCode': 400,
+                'body': to_json({'message': 'Invalid rotation'}),
+            }
+        return simulate_api_call(
+            selectedVoice, selectedLanguage, selectedName, selectedTopic,
+            seed=params.get('seed'), rotation=int(rotation),
+            stitch=is_true(params.get('stitch')),
+        )
+    elif path == '/batchSimulateAPICall':
+        # Body: {"requests": [{"selectedName": ..., "selectedTopic": ...}, ...]}
+        body = get_json_body(event)
+        if not isinstance(body, dict):
+            return {
+                'statusCode': 400,
+                'body': to_json({'message': 'Invalid JSON body'}),
+            }
+        return batch_simulate_api_call(body.get('requests'))
     else:
         return {
             'statusCode': 404,
-            'body': json.dumps({'message': 'Not Found'}),
+            'body': to_json({'message': 'Not Found'}),
         }
 
-def get_options():
+def name_option(name):
+    return {
+        'text': name['name'],
+        'value': str(name['id']),
+        'gender': 1 if name['gender'] == 'female' else 0,
+        'language_id': str(name['language_id']),
+    }
+
+def build_options_response(catalog, include_names=True):
     # Prepare voice options
     voice_options = [
         {
@@ -48,7 +185,7 @@ def get_options():
             'value': str(voice['id']),
             'gender': 1 if voice['gender'] == 'female' else 0,
         }
-        for voice in data['voices']
+        for voice in catalog.core['voices']
     ]
 
     # Prepare language options
@@ -58,32 +195,20 @@ def get_options():
             'value': lang['code'],
             'id': str(lang['id']),
         }
-        for lang in data['languages']
+        for lang in catalog.core['languages']
     ]
 
     # Prepare name options
-    name_options = [
-        {
-            'text': name['name'],
-            'value': str(name['id']),
-            'gender': 1 if name['gender'] == 'female' else 0,
-            'language_id': str(name['language_id']),
-        }
-        for name in data['names']
-    ]
+    name_options = [name_option(name) for name in catalog.core['names']] if include_names else []
 
     # Prepare topic options
-    topics = set()
-    for general in data['general']:
-        topics.add(general['theme_name'])
     topic_options = [
         {
-            'text': general['theme_name'],
-            'value': general['theme_name'],
+            'text': theme_name,
+            'value': theme_name,
         }
-        for general in data['general']
+        for theme_name in catalog.topics()
     ]
-    topic_options = [dict(t) for t in {tuple(d.items()) for d in topic_options}]  # Remove duplicates
 
     response = {
         'voiceOptions': voice_options,
@@ -91,6 +216,82 @@ def get_options():
         'nameOptions': name_options,
         'topicOptions': topic_options,
     }
+    with metrics.timed('serialization'):
+        body = to_json(response)
+    etag = '"' + hashlib.sha256(body.encode('utf-8')).hexdigest()[:32] + '"'
+    return body, etag
+
+def etag_matches(if_none_match, etag):
+    if not if_none_match:
+        return False
+    tags = [tag.strip() for tag in if_none_match.split(',')]
+    return '*' in tags or etag in [tag[2:] if tag.startswith('W/') else tag for tag in tags]
+
+def build_encoded_options(catalog, include_names, encoding):
+    # Precompressed once per catalog and encoding, at the highest compression level
+    options_body, options_etag = catalog.cached(
+        ('options', include_names), lambda catalog: build_options_response(catalog, include_names),
+    )
+    if encoding is None:
+        return options_body, options_etag
+    with metrics.timed('serialization'):
+        body = base64.b64encode(compress(options_body, encoding, best=True)).decode('ascii')
+    return body, f'{options_etag[:-1]}-{encoding}"'
+
+def get_options(if_none_match=None, include_names=True, encoding=None):
+    # The options payload only changes with the catalog, so build it once per catalog
+    catalog = catalog_reloader.current()
+    options_body, options_etag = catalog.cached(
+        ('options', include_names, encoding),
+        lambda catalog: build_encoded_options(catalog, include_names, encoding),
+    )
+    headers = {
+        'Access-Control-Allow-Origin': '*',  # Adjust as needed
+        'Content-Type': 'application/json',
+        'Cache-Control': f'public, max-age={OPTIONS_MAX_AGE}',
+        'ETag': options_etag,
+        'Vary': 'Accept-Encoding',
+    }
+    if etag_matches(if_none_match, options_etag):
+        return {
+            'statusCode': 304,
+            'headers': headers,
+            'body': '',
+        }
+
+    if encoding is None:
+        return {
+            'statusCode': 200,
+            'headers': headers,
+            'body': options_body,
+        }
+
+    headers['Content-Encoding'] = encoding
+    return {
+        'statusCode': 200,
+        'headers': headers,
+        'body': options_body,
+        'isBase64Encoded': True,
+    }
+
+def search_names(language_id, prefix, gender=None, limit=10):
+    # Gender is accepted as in nameOptions (0/1) or by name
+    gender = {'0': 'male', '1': 'female'}.get(gender, gender)
+    if not language_id or gender not in (None, 'male', 'female'):
+        return {
+            'statusCode': 400,
+            'body': to_json({'message': 'languageId and an optional gender are required'}),
+        }
+
+    catalog = catalog_reloader.current()
+    with metrics.timed('lookup'):
+        names = catalog.search_names(language_id, prefix, gender, min(limit, NAME_SEARCH_MAX_LIMIT))
+
+    response = {
+        'nameOptions': [name_option(name) for name in names],
+    }
+    with metrics.timed('serialization'):
+        body = to_json(response)
 
     return {
         'statusCode': 200,
@@ -98,54 +299,122 @@ def get_options():
             'Access-Control-Allow-Origin': '*',  # Adjust as needed
             'Content-Type': 'application/json',
         },
-        'body': json.dumps(response),
+        'body': body,
     }
 
-def simulate_api_call(selectedVoice, selectedLanguage, selectedName, selectedTopic):
+def build_playlist(catalog, selectedName, selectedTopic, seed=None, rotation=0, sign=None, stitch=False):
+    """
+    Resolve (playlist, None) or (None, error) for one name/topic; stitching requires a seed.
+    """
+    sign = sign or generate_presigned_url
+    if stitch and seed is None:
+        return None, 'Stitching requires a seed'
+
     # Find the name
-    name = next((n for n in data['names'] if str(n['id']) == selectedName), None)
+    with metrics.timed('lookup'):
+        name = catalog.names_by_id.get(selectedName)
     if not name:
+        return None, 'Name not found'
+
+    # Only the name's language partition is needed for the rest of the request
+    partition = catalog.partition(name['language_id'])
+
+    with metrics.timed('lookup'):
+        # Find the personal greeting audio
+        greeting_audio_file = partition['personal_audio'].get((selectedName, MESSAGE_TYPE_CODES['greeting']))
+
+        # Playable general audio for the selected topic
+        gender_code = GENDER_CODES.get(name['gender'])
+        general_audio_files = partition['general_audio'].get((selectedTopic, gender_code), ())
+    if not greeting_audio_file:
+        return None, 'Personal greeting not found'
+
+    # Generate presigned URL for the greeting
+    greeting_url = sign(greeting_audio_file)
+
+    # Select up to 5 audio files (a seeded rotation when the client sends a seed)
+    with metrics.timed('sampling'):
+        selected_audio_files = sample_audio_keys(general_audio_files, 5, seed=seed, rotation=rotation)
+
+    general_audio_urls = [sign(audio_file) for audio_file in selected_audio_files]
+
+    # Combine greeting and general audio files
+    playlist = {
+        'audioFiles': [greeting_url] + general_audio_urls,
+    }
+    if stitch:
+        with metrics.timed('stitching'):
+            session_audio_file = stitched_audio_store.get_or_create([greeting_audio_file] + selected_audio_files)
+        playlist['sessionAudioFile'] = sign(session_audio_file)
+    return playlist, None
+
+def simulate_api_call(selectedVoice, selectedLanguage, selectedName, selectedTopic, seed=None, rotation=0, stitch=False):
+    catalog = catalog_reloader.current()
+    response, error = build_playlist(
+        catalog, selectedName, selectedTopic, seed=seed, rotation=rotation, stitch=stitch,
+    )
+    if error:
         return {
             'statusCode': 400,
-            'body': json.dumps({'message': 'Name not found'}),
+            'body': to_json({'message': error}),
         }
 
-    # Find the personal greeting
-    personal_greetings = [
-        p for p in data['personal']
-        if str(p['name_id']) == selectedName and p['type'] == 'greeting'
-    ]
-    if not personal_greetings:
+    with metrics.timed('serialization'):
+        body = to_json(response)
+
+    return {
+        'statusCode': 200,
+        'headers': {
+            'Access-Control-Allow-Origin': '*',  # Adjust as needed
+            'Content-Type': 'application/json',
+        },
+        'body': body,
+    }
+
+def batch_simulate_api_call(playlist_requests):
+    """
+    Build several playlists in one invocation, signing each shared S3 key once per batch.
+    """
+    if not isinstance(playlist_requests, list) or not playlist_requests:
         return {
             'statusCode': 400,
-            'body': json.dumps({'message': 'Personal greeting not found'}),
+            'body': to_json({'message': 'Expected a non-empty list of requests'}),
+        }
+    if len(playlist_requests) > BATCH_MAX_SIZE:
+        return {
+            'statusCode': 400,
+            'body': to_json({'message': f'At most {BATCH_MAX_SIZE} requests per batch'}),
         }
 
-    # Get the audio file and generate presigned URL
-    greeting_audio_file = personal_greetings[0]['audio_file']
-    greeting_url = generate_presigned_url(greeting_audio_file)
-
-    # Find general messages based on selected options
-    general_messages = [
-        g for g in data['general']
-        if g['theme_name'] == selectedTopic
-        and g['gender'] == name['gender']
-        and str(g['category_id']) in [str(c['id']) for c in data['categories'] if str(c['language_id']) == str(name['language_id'])]
-    ]
-
-    # Randomly select up to 5 audio files
-    selected_general_messages = random.sample(general_messages, min(5, len(general_messages)))
+    # Every playlist of the batch is served from the same catalog version
+    catalog = catalog_reloader.current()
+    signed_urls = {}
 
-    general_audio_urls = [
-        generate_presigned_url(g['audio_file']) for g in selected_general_messages
-    ]
+    def sign(s3_file_name):
+        if s3_file_name not in signed_urls:
+            signed_urls[s3_file_name] = generate_presigned_url(s3_file_name)
+        return signed_urls[s3_file_name]
 
-    # Combine greeting and general audio files
-    audio_files = [greeting_url] + general_audio_urls
+    playlists = []
+    for params in playlist_requests:
+        if not isinstance(params, dict):
+            playlists.append({'message': 'Invalid request'})
+            continue
+        rotation = params.get('rotation', 0)
+        if not isinstance(rotation, int) or isinstance(rotation, bool) or rotation < 0:
+            playlists.append({'message': 'Invalid rotation'})
+            continue
+        playlist, error = build_playlist(
+            catalog, str(params.get('selectedName')), params.get('selectedTopic'),
+            seed=params.get('seed'), rotation=rotation, sign=sign, stitch=is_true(params.get('stitch')),
+        )
+        playlists.append({'message': error} if error else playlist)
 
     response = {
-        'audioFiles': audio_files,
+        'playlists': playlists,
     }
+    with metrics.timed('serialization'):
+        body = to_json(response)
 
     return {
         'statusCode': 200,
@@ -153,7 +422,7 @@ def simulate_api_call(selectedVoice, selectedLanguage, selectedName, selectedTop
             'Access-Control-Allow-Origin': '*',  # Adjust as needed
             'Content-Type': 'application/json',
         },
-        'body': json.dumps(response),
+        'body': body,
     }
 
 def get_language_flag(code):
@@ -167,4 +436,3 @@ def get_language_flag(code):
         'pt': '🇵🇹',
     }
     return flags.get(code, '')
-
@@ -1,9 +1,9 @@
 # manage_categories.py
 
 import streamlit as st
-from database import execute_query, fetch_all, fetch_one
+from database import execute_batch, execute_query, fetch_all, fetch_one, find_voice_id, get_category_language_id, get_language, get_languages
 import pandas as pd
-from utils import clear_form_states
+from utils import clear_form_states, confirm_delete, paginated_grid, show_batch_problems
 from openai_utils import generate_general_text, generate_themes_and_topics
 from tts import text_to_speech_stream
 from s3_utils import upload_audiostream_to_s3, generate_presigned_url
@@ -40,39 +40,37 @@ def manage_categories(conn):
 
 def view_all_categories(conn):
     """
-    View all categories in the database.
+    View all categories in the database, one page at a time.
     """
     st.subheader("All Categories")
-    query = """
-        SELECT category.id, category.name, language.code 
-        FROM category 
-        JOIN language ON category.language_id = language.id
-    """
-    data = fetch_all(conn, query)
-    if data:
-        for row in data:
-            col1, col2, col3, col4, col5 = st.columns([3,2,2,2,2])
-            col1.write(f"**{row[1]}**")  # Category Name
-            col2.write(row[2])  # Language Code
-            update_clicked = col3.button("Update", key=f"update_category_{row[0]}")
-            delete_clicked = col4.button("Delete", key=f"delete_category_{row[0]}")
-            view_clicked = col5.button("View", key=f"view_category_{row[0]}")
-            if update_clicked:
-                st.session_state['show_update_form'] = True
-                st.session_state['update_id'] = row[0]
-                st.session_state['current_view'] = None
-                st.rerun()
-            if delete_clicked:
-                delete_category(conn, row[0])
-                st.rerun()
-            if view_clicked:
-                st.session_state['category_id'] = row[0]
-                st.session_state['category_name'] = row[1]
-                st.session_state['show_category_page'] = True
-                st.session_state['current_view'] = None
+    selected = paginated_grid(conn, 'categories', {
+        'from': "category JOIN language ON category.language_id = language.id",
+        'id': "category.id",
+        'columns': {'Name': "category.name", 'Language': "language.code"},
+        'sort': {'Name': "category.name", 'Language': "language.code"},
+        'search': "category.name",
+        'filters': {
+            'Language': ("category.language_id", {code: id for id, _, code in get_languages(conn)}),
+        },
+    })
+    if selected:
+        col1, col2, col3 = st.columns(3)
+        if col1.button("Update", key=f"update_category_{selected[0]}"):
+            st.session_state['show_update_form'] = True
+            st.session_state['update_id'] = selected[0]
+            st.session_state['current_view'] = None
+            st.rerun()
+        if col2.button("Delete", key=f"delete_category_{selected[0]}"):
+            st.session_state['pending_delete'] = ('category', selected[0])
+        if col3.button("View", key=f"view_category_{selected[0]}"):
+            st.session_state['category_id'] = selected[0]
+            st.session_state['category_name'] = selected[1]
+            st.session_state['show_category_page'] = True
+            st.session_state['current_view'] = None
+            st.rerun()
+        if st.session_state.get('pending_delete') == ('category', selected[0]):
+            if delete_category(conn, selected[0]):
                 st.rerun()
-    else:
-        st.info("No categories found. Please add categories.")
 
 def add_category(conn):
     """
@@ -81,9 +79,9 @@ def add_category(conn):
     st.subheader("Add Category")
     
     # Fetch languages
-    languages = fetch_all(conn, "SELECT id, name FROM language")
+    languages = get_languages(conn)
     if languages:
-        language_options = {name: id for id, name in languages}
+        language_options = {name: id for id, name, _ in languages}
         language_name = st.selectbox("Language", list(language_options.keys()), key="add_category_language")
         language_id = language_options[language_name]
     else:
@@ -118,8 +116,8 @@ def bulk_add_categories(conn):
         required_columns = {'name', 'language_code'}
         if required_columns.issubset(df.columns):
             # Fetch languages
-            languages = fetch_all(conn, "SELECT id, code FROM language")
-            language_dict = {code: id for id, code in languages}
+            languages = get_languages(conn)
+            language_dict = {code: id for id, _, code in languages}
             records = []
             for _, row in df.iterrows():
                 language_code = row['language_code']
@@ -129,17 +127,12 @@ def bulk_add_categories(conn):
                 else:
                     st.warning(f"Language code '{language_code}' not found. Skipping category '{row['name']}'.")
             if st.button("Save Categories", key="save_bulk_categories_button"):
-                success_count = 0
-                for record in records:
-                    try:
-                        execute_query(conn, 
-                            "INSERT INTO category (name, language_id) VALUES (?, ?)",
-                            record
-                        )
-                        success_count += 1
-                    except Exception as e:
-                        st.warning(f"Skipped duplicate category: {record[0]}")
-                st.success(f"Bulk added {success_count} categories.")
+                result = execute_batch(conn, 
+                    "INSERT INTO category (name, language_id) VALUES (?, ?) ON CONFLICT DO NOTHING",
+                    records
+                )
+                show_batch_problems(result, [record[0] for record in records], "categories")
+                st.success(f"Bulk added {result.changed} categories.")
                 clear_form_states()
                 st.session_state['current_view'] = 'view_all'
                 st.rerun()
@@ -156,8 +149,8 @@ def update_category(conn, category_id):
         new_category_name = st.text_input("New Category Name", value=category_record[0], key="update_category_input")
         
         # Fetch languages
-        languages = fetch_all(conn, "SELECT id, name FROM language")
-        language_options = {name: id for id, name in languages}
+        languages = get_languages(conn)
+        language_options = {name: id for id, name, _ in languages}
         language_names = list(language_options.keys())
         current_language_name = next(name for name, id in language_options.items() if id == category_record[1])
         new_language_name = st.selectbox("Language", language_names, index=language_names.index(current_language_name), key="update_category_language")
@@ -185,35 +178,34 @@ def update_category(conn, category_id):
 
 def delete_category(conn, category_id):
     """
-    Delete a category from the database.
+    Delete a category and, after confirmation, its themes and topics.
+
+    Returns True once the category is deleted (see confirm_delete).
     """
     category_record = fetch_one(conn, "SELECT name FROM category WHERE id = ?", (category_id,))
     if category_record:
-        execute_query(conn, "DELETE FROM category WHERE id = ?", (category_id,))
+        if not confirm_delete(conn, 'category', category_id, f"category '{category_record[0]}'"):
+            return False
         st.success(f"Deleted category '{category_record[0]}'")
-    else:
-        st.error("Category not found.")
+        return True
+    st.error("Category not found.")
+    st.session_state['pending_delete'] = None
+    return False
 
 def category_page(conn, category_id, category_name):
     """
     Display the category page where themes and topics can be generated and managed.
     """
     st.subheader(f"Category: {category_name}")
-    category_info = fetch_one(conn, "SELECT language_id FROM category WHERE id = ?", (category_id,))
-    language_id = category_info[0]
+    language_id = get_category_language_id(conn, category_id)
     
     # Get language code and name
-    language_info = fetch_one(conn, "SELECT code, name FROM language WHERE id = ?", (language_id,))
-    language_code = language_info[0]
-    language_name = language_info[1]
+    _, language_name, language_code = get_language(conn, language_id)
 
     gender = st.selectbox("Select Gender for Text Generation", ["male", "female"], key=f"gender_{category_id}")
 
     # Check if a voice exists for the selected gender and language
-    matching_voice = fetch_one(conn, 
-        "SELECT voice.id FROM voice WHERE language_id = ? AND gender = ?",
-        (language_id, gender)
-    )
+    matching_voice = find_voice_id(conn, language_id, gender)
 
     if not matching_voice:
         st.error(f"No voice available for gender '{gender}' and language '{language_name}'. Cannot generate themes and topics.")
@@ -230,17 +222,16 @@ def category_page(conn, category_id, category_name):
         import json
         try:
             data = json.loads(themes_and_topics_json)
-            for theme in data.get("themes", []):
-                theme_name = theme.get("theme_name")
-                topics = theme.get("topics", [])
-                for topic in topics:
-                    try:
-                        execute_query(conn, 
-                            "INSERT INTO general (category_id, theme_name, topic_name, gender) VALUES (?, ?, ?, ?)",
-                            (category_id, theme_name, topic, gender)
-                        )
-                    except Exception as e:
-                        st.warning(f"Skipped duplicate theme/topic: {theme_name}/{topic}")
+            records = [
+                (category_id, theme.get("theme_name"), topic, gender)
+                for theme in data.get("themes", [])
+                for topic in theme.get("topics", [])
+            ]
+            result = execute_batch(conn, 
+                "INSERT INTO general (category_id, theme_name, topic_name, gender) VALUES (?, ?, ?, ?)",
+                records
+            )
+            show_batch_problems(result, [f"{record[1]}/{record[2]}" for record in records], "themes/topics")
             st.success("Themes and topics generated and saved.")
             st.rerun()
         except Exception as e:
@@ -298,12 +289,9 @@ def get_voice_id(conn, language_id, gender):
     """
     Get the ElevenLabs voice ID for the given language and gender.
     """
-    voice_record = fetch_one(conn, 
-        "SELECT elevenlabs_voice_id FROM voice WHERE language_id = ? AND gender = ? LIMIT 1",
-        (language_id, gender)
-    )
-    if voice_record:
-        return voice_record[0]
+    voice_id = find_voice_id(conn, language_id, gender)
+    if voice_id:
+        return voice_id
     else:
         st.error(f"No voice found for language ID {language_id} and gender {gender}.")
         return None
@@ -1,7 +1,7 @@
 import streamlit as st
-from database import execute_query, fetch_all, fetch_one
+from database import execute_batch, execute_query, fetch_one
 import pandas as pd
-from utils import clear_form_states
+from utils import clear_form_states, confirm_delete, paginated_grid, show_batch_problems
 
 def manage_languages(conn):
     """
@@ -32,27 +32,28 @@ def manage_languages(conn):
 
 def view_all_languages(conn):
     """
-    View all languages in the database.
+    View all languages in the database, one page at a time.
     """
     st.subheader("All Languages")
-    data = fetch_all(conn, "SELECT * FROM language")
-    if data:
-        for row in data:
-            col1, col2, col3, col4 = st.columns([3,2,2,2])
-            col1.write(row[1])  # Language Name
-            col2.write(row[2])  # Language Code
-            update_clicked = col3.button("Update", key=f"update_language_{row[0]}")
-            delete_clicked = col4.button("Delete", key=f"delete_language_{row[0]}")
-            if update_clicked:
-                st.session_state['show_update_form'] = True
-                st.session_state['update_id'] = row[0]
-                st.session_state['current_view'] = None
+    selected = paginated_grid(conn, 'languages', {
+        'from': "language",
+        'id': "language.id",
+        'columns': {'Name': "language.name", 'Code': "language.code"},
+        'sort': {'Name': "language.name", 'Code': "language.code"},
+        'search': "language.name",
+    })
+    if selected:
+        col1, col2 = st.columns(2)
+        if col1.button("Update", key=f"update_language_{selected[0]}"):
+            st.session_state['show_update_form'] = True
+            st.session_state['update_id'] = selected[0]
+            st.session_state['current_view'] = None
+            st.rerun()
+        if col2.button("Delete", key=f"delete_language_{selected[0]}"):
+            st.session_state['pending_delete'] = ('language', selected[0])
+        if st.session_state.get('pending_delete') == ('language', selected[0]):
+            if delete_language(conn, selected[0]):
                 st.rerun()
-            if delete_clicked:
-                delete_language(conn, row[0])
-                st.rerun()
-    else:
-        st.info("No languages found. Please add languages.")
 
 def add_language(conn):
     """
@@ -85,14 +86,9 @@ def bulk_add_languages(conn):
         if 'name' in df.columns and 'code' in df.columns:
             records = df[['name', 'code']].values.tolist()
             if st.button("Save Languages", key="save_bulk_languages_button"):
-                success_count = 0
-                for record in records:
-                    try:
-                        execute_query(conn, "INSERT INTO language (name, code) VALUES (?, ?)", record)
-                        success_count += 1
-                    except Exception as e:
-                        st.warning(f"Skipped duplicate language: {record[0]}")
-                st.success(f"Bulk added {success_count} languages.")
+                result = execute_batch(conn, "INSERT INTO language (name, code) VALUES (?, ?) ON CONFLICT DO NOTHING", records)
+                show_batch_problems(result, [record[0] for record in records], "languages")
+                st.success(f"Bulk added {result.changed} languages.")
                 clear_form_states()
                 st.session_state['current_view'] = 'view_all'
                 st.experimental_rerun()
@@ -127,11 +123,16 @@ def update_language(conn, language_id):
 
 def delete_language(conn, language_id):
     """
-    Delete a language from the database.
+    Delete a language and, after confirmation, its voices, names and categories with their messages.
+
+    Returns True once the language is deleted (see confirm_delete).
     """
     language_record = fetch_one(conn, "SELECT name FROM language WHERE id = ?", (language_id,))
     if language_record:
-        execute_query(conn, "DELETE FROM language WHERE id = ?", (language_id,))
+        if not confirm_delete(conn, 'language', language_id, f"language '{language_record[0]}'"):
+            return False
         st.success(f"Deleted language '{language_record[0]}'")
-    else:
-        st.error("Language not found.")
+        return True
+    st.error("Language not found.")
+    st.session_state['pending_delete'] = None
+    return False
@@ -1,9 +1,9 @@
 # manage_names.py
 
 import streamlit as st
-from database import execute_query, fetch_all, fetch_one
+from database import execute_batch, execute_query, fetch_all, fetch_one, find_voice_id, get_language, get_languages
 import pandas as pd
-from utils import clear_form_states
+from utils import clear_form_states, confirm_delete, paginated_grid, show_batch_problems
 from openai_utils import generate_personal_text
 from tts import text_to_speech_stream
 from s3_utils import upload_audiostream_to_s3, generate_presigned_url
@@ -52,44 +52,43 @@ def manage_names(conn):
 
 def view_all_names(conn):
     """
-    View all names in the database.
+    View all names in the database, one page at a time.
     """
     st.subheader("All Names")
-    query = """
-        SELECT name.id, name.name, name.gender, language.code, language.id
-        FROM name
-        JOIN language ON name.language_id = language.id
-    """
-    data = fetch_all(conn, query)
-    if data:
-        for row in data:
-            col1, col2, col3, col4, col5, col6, col7 = st.columns([2,2,2,2,2,2,2])
-            col1.write(row[1])  # Name
-            col2.write(row[2])  # Gender
-            col3.write(row[3])  # Language Code
-            update_clicked = col4.button("Update", key=f"update_name_{row[0]}")
-            delete_clicked = col5.button("Delete", key=f"delete_name_{row[0]}")
-            generate_clicked = col6.button("Gen TTS", key=f"generate_messages_{row[0]}")
-            view_clicked = col7.button("View", key=f"view_name_{row[0]}")
-            if view_clicked:
-                st.session_state['name_page'] = True
-                st.session_state['name_id'] = row[0]
-                st.session_state['current_view'] = None
-                st.rerun()
-            if update_clicked:
-                st.session_state['show_update_form'] = True
-                st.session_state['update_id'] = row[0]
-                st.session_state['current_view'] = None
-                st.session_state['name_page'] = False
-                st.rerun()
-            if delete_clicked:
-                delete_name(conn, row[0])
-                st.rerun()
-            if generate_clicked:
-                generate_messages_for_name(conn, row[0], row[1], row[2], row[4])
+    selected = paginated_grid(conn, 'names', {
+        'from': "name JOIN language ON name.language_id = language.id",
+        'id': "name.id",
+        'columns': {'Name': "name.name", 'Gender': "name.gender", 'Language': "language.code"},
+        'sort': {'Name': "name.name", 'Added': "name.id"},
+        'search': "name.name",
+        'filters': {
+            'Gender': ("name.gender", {'male': 'male', 'female': 'female'}),
+            'Language': ("name.language_id", {code: id for id, _, code in get_languages(conn)}),
+        },
+    })
+    if selected:
+        name_id = selected[0]
+        col1, col2, col3, col4 = st.columns(4)
+        if col1.button("Update", key=f"update_name_{name_id}"):
+            st.session_state['show_update_form'] = True
+            st.session_state['update_id'] = name_id
+            st.session_state['current_view'] = None
+            st.session_state['name_page'] = False
+            st.rerun()
+        if col2.button("Delete", key=f"delete_name_{name_id}"):
+            st.session_state['pending_delete'] = ('name', name_id)
+        if col3.button("Gen TTS", key=f"generate_messages_{name_id}"):
+            name, gender, language_id = fetch_one(conn, "SELECT name, gender, language_id FROM name WHERE id = ?", (name_id,))
+            generate_messages_for_name(conn, name_id, name, gender, language_id)
+            st.rerun()
+        if col4.button("View", key=f"view_name_{name_id}"):
+            st.session_state['name_page'] = True
+            st.session_state['name_id'] = name_id
+            st.session_state['current_view'] = None
+            st.rerun()
+        if st.session_state.get('pending_delete') == ('name', name_id):
+            if delete_name(conn, name_id):
                 st.rerun()
-    else:
-        st.info("No names found. Please add names.")
 
 def add_name(conn):
     """
@@ -100,9 +99,9 @@ def add_name(conn):
     gender = st.selectbox("Gender", ["male", "female"], key="add_name_gender")
     
     # Fetch languages
-    languages = fetch_all(conn, "SELECT id, name FROM language")
+    languages = get_languages(conn)
     if languages:
-        language_options = {name: id for id, name in languages}
+        language_options = {name: id for id, name, _ in languages}
         language_name = st.selectbox("Language", list(language_options.keys()), key="add_category_language")
         language_id = language_options[language_name]
     else:
@@ -137,28 +136,22 @@ def bulk_add_names(conn):
         required_columns = {'name', 'gender', 'language_code'}
         if required_columns.issubset(df.columns):
             # Fetch languages
-            languages = fetch_all(conn, "SELECT id, code FROM language")
-            language_dict = {code: id for id, code in languages}
+            languages = get_languages(conn)
+            language_dict = {code: id for id, _, code in languages}
             records = []
-            for _, row in df.iterrows():
-                language_code = row['language_code']
+            for name, gender, language_code in zip(df['name'], df['gender'], df['language_code']):
                 language_id = language_dict.get(language_code)
                 if language_id:
-                    records.append((row['name'], row['gender'], language_id))
+                    records.append((name, gender, language_id))
                 else:
-                    st.warning(f"Language code '{language_code}' not found. Skipping name '{row['name']}'.")
+                    st.warning(f"Language code '{language_code}' not found. Skipping name '{name}'.")
             if st.button("Save Names", key="save_bulk_names_button"):
-                success_count = 0
-                for record in records:
-                    try:
-                        execute_query(conn,
-                            "INSERT INTO name (name, gender, language_id) VALUES (?, ?, ?)",
-                            record
-                        )
-                        success_count += 1
-                    except Exception as e:
-                        st.warning(f"Skipped duplicate: {record}")
-                st.success(f"Bulk added {success_count} names.")
+                result = execute_batch(conn,
+                    "INSERT INTO name (name, gender, language_id) VALUES (?, ?, ?) ON CONFLICT DO NOTHING",
+                    records
+                )
+                show_batch_problems(result, records, "names")
+                st.success(f"Bulk added {result.changed} names.")
                 clear_form_states()
                 st.session_state['current_view'] = 'view_all'
                 st.session_state['name_page'] = False
@@ -177,8 +170,8 @@ def update_name(conn, name_id):
         new_gender = st.selectbox("New Gender", ["male", "female"], index=["male", "female"].index(name_record[1]), key="update_gender")
         
         # Fetch languages
-        languages = fetch_all(conn, "SELECT id, name FROM language")
-        language_options = {name: id for id, name in languages}
+        languages = get_languages(conn)
+        language_options = {name: id for id, name, _ in languages}
         language_names = list(language_options.keys())
         current_language_name = next(name for name, id in language_options.items() if id == name_record[2])
         new_language_name = st.selectbox("Language", language_names, index=language_names.index(current_language_name), key="update_name_language")
@@ -208,14 +201,19 @@ def update_name(conn, name_id):
 
 def delete_name(conn, name_id):
     """
-    Delete a name from the database.
+    Delete a name and, after confirmation, its personal messages.
+
+    Returns True once the name is deleted (see confirm_delete).
     """
     name_record = fetch_one(conn, "SELECT name FROM name WHERE id = ?", (name_id,))
     if name_record:
-        execute_query(conn, "DELETE FROM name WHERE id = ?", (name_id,))
+        if not confirm_delete(conn, 'name', name_id, f"name '{name_record[0]}'"):
+            return False
         st.success(f"Deleted name '{name_record[0]}'")
-    else:
-        st.error("Name not found.")
+        return True
+    st.error("Name not found.")
+    st.session_state['pending_delete'] = None
+    return False
 
 def name_page(conn, name_id):
     """
@@ -309,10 +307,9 @@ def generate_messages_for_name(conn, name_id, name, gender, language_id):
     Generate messages for a specific name.
     """
     # Fetch language code and name
-    language_info = fetch_one(conn, "SELECT code, name FROM language WHERE id = ?", (language_id,))
+    language_info = get_language(conn, language_id)
     if language_info:
-        language_code = language_info[0]
-        language_name = language_info[1]
+        _, language_name, language_code = language_info
     else:
         st.error(f"Language ID {language_id} not found for name ID {name_id}.")
         return
@@ -345,12 +342,9 @@ def get_voice_id(conn, language_id, gender):
     """
     Get the ElevenLabs voice ID for the given language and gender.
     """
-    voice_record = fetch_one(conn,
-        "SELECT elevenlabs_voice_id FROM voice WHERE language_id = ? AND gender = ? LIMIT 1",
-        (language_id, gender)
-    )
-    if voice_record:
-        return voice_record[0]
+    voice_id = find_voice_id(conn, language_id, gender)
+    if voice_id:
+        return voice_id
     else:
         st.error(f"No voice found for language ID {language_id} and gender {gender}.")
         return None
\ No newline at end of file
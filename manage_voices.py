@@ -1,9 +1,9 @@
 # manage_voices.py
 
 import streamlit as st
-from database import execute_query, fetch_all, fetch_one
+from database import execute_batch, execute_query, fetch_one, get_languages
 import pandas as pd
-from utils import clear_form_states
+from utils import clear_form_states, paginated_grid, show_batch_problems
 
 def manage_voices(conn):
     """
@@ -35,34 +35,35 @@ def manage_voices(conn):
 
 def view_all_voices(conn):
     """
-    View all voices in the database.
+    View all voices in the database, one page at a time.
     """
     st.subheader("All Voices")
-    query = """
-        SELECT voice.id, voice.name, voice.gender, language.code, voice.elevenlabs_voice_id 
-        FROM voice 
-        JOIN language ON voice.language_id = language.id
-    """
-    data = fetch_all(conn, query)
-    if data:
-        for row in data:
-            col1, col2, col3, col4, col5, col6 = st.columns([2,2,2,2,2,2])
-            col1.write(row[1])  # Voice Name
-            col2.write(row[2])  # Gender
-            col3.write(row[3])  # Language Code
-            col4.write(row[4])  # ElevenLabs Voice ID
-            update_clicked = col5.button("Update", key=f"update_voice_{row[0]}")
-            delete_clicked = col6.button("Delete", key=f"delete_voice_{row[0]}")
-            if update_clicked:
-                st.session_state['show_update_form'] = True
-                st.session_state['update_id'] = row[0]
-                st.session_state['current_view'] = None
-                st.rerun()
-            if delete_clicked:
-                delete_voice(conn, row[0])
-                st.rerun()
-    else:
-        st.info("No voices found. Please add voices.")
+    selected = paginated_grid(conn, 'voices', {
+        'from': "voice JOIN language ON voice.language_id = language.id",
+        'id': "voice.id",
+        'columns': {
+            'Name': "voice.name",
+            'Gender': "voice.gender",
+            'Language': "language.code",
+            'ElevenLabs Voice ID': "voice.elevenlabs_voice_id",
+        },
+        'sort': {'Name': "voice.name", 'Language': "language.code"},
+        'search': "voice.name",
+        'filters': {
+            'Gender': ("voice.gender", {'male': 'male', 'female': 'female'}),
+            'Language': ("voice.language_id", {code: id for id, _, code in get_languages(conn)}),
+        },
+    })
+    if selected:
+        col1, col2 = st.columns(2)
+        if col1.button("Update", key=f"update_voice_{selected[0]}"):
+            st.session_state['show_update_form'] = True
+            st.session_state['update_id'] = selected[0]
+            st.session_state['current_view'] = None
+            st.rerun()
+        if col2.button("Delete", key=f"delete_voice_{selected[0]}"):
+            delete_voice(conn, selected[0])
+            st.rerun()
 
 def add_voice(conn):
     """
@@ -74,9 +75,9 @@ def add_voice(conn):
     gender = st.selectbox("Gender", ["male", "female"], key="add_voice_gender")
     
     # Fetch languages
-    languages = fetch_all(conn, "SELECT id, name FROM language")
+    languages = get_languages(conn)
     if languages:
-        language_options = {name: id for id, name in languages}
+        language_options = {name: id for id, name, _ in languages}
         language_name = st.selectbox("Language", list(language_options.keys()), key="add_voice_language_name")
         language_id = language_options[language_name]
     else:
@@ -110,8 +111,8 @@ def bulk_add_voices(conn):
         required_columns = {'name', 'elevenlabs_voice_id', 'gender', 'language_code'}
         if required_columns.issubset(df.columns):
             # Fetch languages
-            languages = fetch_all(conn, "SELECT id, code FROM language")
-            language_dict = {code: id for id, code in languages}
+            languages = get_languages(conn)
+            language_dict = {code: id for id, _, code in languages}
             records = []
             for _, row in df.iterrows():
                 language_code = row['language_code']
@@ -121,17 +122,12 @@ def bulk_add_voices(conn):
                 else:
                     st.warning(f"Language code '{language_code}' not found. Skipping voice '{row['name']}'.")
             if st.button("Save Voices", key="save_bulk_voices_button"):
-                success_count = 0
-                for record in records:
-                    try:
-                        execute_query(conn, 
-                            "INSERT INTO voice (name, elevenlabs_voice_id, gender, language_id) VALUES (?, ?, ?, ?)",
-                            record
-                        )
-                        success_count += 1
-                    except Exception as e:
-                        st.warning(f"Skipped duplicate voice: {record[0]}")
-                st.success(f"Bulk added {success_count} voices.")
+                result = execute_batch(conn, 
+                    "INSERT INTO voice (name, elevenlabs_voice_id, gender, language_id) VALUES (?, ?, ?, ?) ON CONFLICT DO NOTHING",
+                    records
+                )
+                show_batch_problems(result, [record[0] for record in records], "voices")
+                st.success(f"Bulk added {result.changed} voices.")
                 clear_form_states()
                 st.session_state['current_view'] = 'view_all'
                 st.rerun()
@@ -150,8 +146,8 @@ def update_voice(conn, voice_id):
         new_gender = st.selectbox("New Gender", ["male", "female"], index=["male", "female"].index(voice_record[2]), key="update_voice_gender")
         
         # Fetch languages
-        languages = fetch_all(conn, "SELECT id, name FROM language")
-        language_options = {name: id for id, name in languages}
+        languages = get_languages(conn)
+        language_options = {name: id for id, name, _ in languages}
         language_names = list(language_options.keys())
         current_language_name = next(name for name, id in language_options.items() if id == voice_record[3])
         new_language_name = st.selectbox("Language", language_names, index=language_names.index(current_language_name), key="update_voice_language_name")
@@ -0,0 +1,145 @@
+# metrics.py
+#
+# Per-invocation stage timings for the Lambda, emitted as one CloudWatch
+# Embedded Metric Format (EMF) log line per invocation, plus a local
+# aggregator that turns those lines into per-stage percentiles:
+#
+#   python metrics.py lambda.log [more.log ...]
+
+import argparse
+import contextvars
+import json
+import sys
+import time
+from contextlib import contextmanager
+
+NAMESPACE = 'HoneyAudio/Lambda'
+STAGES = ['snapshot_load', 'lookup', 'sampling', 'signing', 'stitching', 'serialization', 'total']
+
+_current = contextvars.ContextVar('invocation_metrics', default=None)
+
+class InvocationMetrics:
+    """
+    Stage durations (ms) and properties collected during one invocation.
+    """
+
+    def __init__(self, route, cold_start):
+        self.route = route
+        self.cold_start = cold_start
+        self.stages = {}
+        self.properties = {}
+        self._started = time.perf_counter()
+
+    def add(self, stage, milliseconds):
+        self.stages[stage] = self.stages.get(stage, 0.0) + milliseconds
+
+    def finish(self):
+        self.stages['total'] = (time.perf_counter() - self._started) * 1000
+
+    def to_emf(self):
+        record = {
+            '_aws': {
+                'Timestamp': int(time.time() * 1000),
+                'CloudWatchMetrics': [{
+                    'Namespace': NAMESPACE,
+                    'Dimensions': [['Route']],
+                    'Metrics': [{'Name': stage, 'Unit': 'Milliseconds'} for stage in self.stages],
+                }],
+            },
+            'Route': self.route,
+            'ColdStart': self.cold_start,
+        }
+        record.update(self.properties)
+        record.update({stage: round(value, 3) for stage, value in self.stages.items()})
+        return json.dumps(record, separators=(',', ':'))
+
+@contextmanager
+def invocation(route, cold_start):
+    """
+    Collect metrics for the enclosed invocation and print them as one EMF line.
+    """
+    metrics = InvocationMetrics(route, cold_start)
+    token = _current.set(metrics)
+    try:
+        yield metrics
+    finally:
+        _current.reset(token)
+        metrics.finish()
+        print(metrics.to_emf())
+
+@contextmanager
+def timed(stage):
+    """
+    Add the duration of the enclosed block to a stage of the current invocation.
+    """
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        metrics = _current.get()
+        if metrics is not None:
+            metrics.add(stage, (time.perf_counter() - started) * 1000)
+
+def _percentile(sorted_values, percent):
+    # Nearest-rank percentile
+    index = max(0, -(-len(sorted_values) * percent // 100) - 1)
+    return sorted_values[int(index)]
+
+def aggregate(lines):
+    """
+    Summarize EMF lines into count/p50/p95/p99 per (route, stage) and cold starts.
+    """
+    samples = {}
+    cold_starts = {}
+    for line in lines:
+        line = line.strip()
+        start = line.find('{')
+        if start < 0 or '"_aws"' not in line:
+            continue
+        try:
+            entry = json.loads(line[start:])
+        except ValueError:
+            continue
+        route = entry.get('Route')
+        if entry.get('ColdStart'):
+            cold_starts[route] = cold_starts.get(route, 0) + 1
+        for stage in STAGES:
+            if stage in entry:
+                samples.setdefault((route, stage), []).append(entry[stage])
+
+    summary = {}
+    for (route, stage), values in samples.items():
+        values.sort()
+        summary.setdefault(route, {'cold_starts': cold_starts.get(route, 0), 'stages': {}})
+        summary[route]['stages'][stage] = {
+            'count': len(values),
+            'p50': _percentile(values, 50),
+            'p95': _percentile(values, 95),
+            'p99': _percentile(values, 99),
+        }
+    return summary
+
+def print_summary(summary, out=sys.stdout):
+    for route, route_summary in sorted(summary.items(), key=lambda item: str(item[0])):
+        out.write(f"{route}  (cold starts: {route_summary['cold_starts']})\n")
+        for stage in STAGES:
+            stats = route_summary['stages'].get(stage)
+            if stats:
+                out.write(
+                    f"  {stage:<14} n={stats['count']:<7} p50={stats['p50']:9.3f} ms"
+                    f"  p95={stats['p95']:9.3f} ms  p99={stats['p99']:9.3f} ms\n"
+                )
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Aggregate Lambda EMF log lines into per-stage percentiles.")
+    parser.add_argument('logs', nargs='*', help="Log files (reads stdin when omitted)")
+    args = parser.parse_args()
+
+    if args.logs:
+        lines = []
+        for log in args.logs:
+            with open(log, 'r', encoding='utf-8') as f:
+                lines.extend(f)
+    else:
+        lines = sys.stdin
+    print_summary(aggregate(lines))
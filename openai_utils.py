@@ -1,5 +1,6 @@
 import openai
 from config import OPENAI_API_KEY
+from database import fetch_one, get_category_language_id, get_language
 
 # Initialize OpenAI API key
 openai.api_key = OPENAI_API_KEY
@@ -40,18 +41,13 @@ def generate_themes_and_topics(category_name, description, num_themes, num_topic
     return content  # You should parse the content as needed
 
 def generate_general_text(conn, category_id, theme_name, topic_name, gender):
-    cursor = conn.cursor()
-    cursor.execute("SELECT language.name FROM category JOIN language ON category.language_id = language.id WHERE category.id = ?", (category_id,))
-    language_name = cursor.fetchone()[0]
-    # Fetch language_id
-    cursor.execute("SELECT language_id FROM category WHERE id = ?", (category_id,))
-    language_id = cursor.fetchone()[0]
+    language_id = get_category_language_id(conn, category_id)
+    language_name = get_language(conn, language_id)[1]
 
     # Count existing texts for this theme, language, and gender
-    cursor.execute("""
+    existing_texts_count = fetch_one(conn, """
         SELECT COUNT(*) FROM general WHERE category_id = ? AND theme_name = ? AND gender = ? AND text IS NOT NULL
-    """, (category_id, theme_name, gender))
-    existing_texts_count = cursor.fetchone()[0]
+    """, (category_id, theme_name, gender))[0]
 
     # Calculate character limit
     text_number = existing_texts_count + 1
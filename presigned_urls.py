@@ -0,0 +1,47 @@
+# presigned_urls.py
+
+import threading
+import time
+from collections import OrderedDict
+
+class PresignedUrlCache:
+    """
+    Bounded LRU cache of presigned S3 URLs, re-signed once less than refresh_margin seconds remain.
+    """
+
+    def __init__(self, sign, expires_in=3600, refresh_margin=900, max_size=10000, clock=time.monotonic):
+        self._sign = sign
+        self.expires_in = expires_in
+        self.refresh_margin = refresh_margin
+        self.max_size = max_size
+        self._clock = clock
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, s3_file_name):
+        now = self._clock()
+        with self._lock:
+            entry = self._entries.get(s3_file_name)
+            if entry is not None and entry[1] - now > self.refresh_margin:
+                self._entries.move_to_end(s3_file_name)
+                self.hits += 1
+                return entry[0]
+            self.misses += 1
+
+        # Sign outside the lock; concurrent misses for one key just sign twice
+        signed_url = self._sign(s3_file_name, self.expires_in)
+        with self._lock:
+            self._entries[s3_file_name] = (signed_url, now + self.expires_in)
+            self._entries.move_to_end(s3_file_name)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+        return signed_url
+
+    def stats(self):
+        return {'size': len(self._entries), 'hits': self.hits, 'misses': self.misses}
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
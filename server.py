@@ -0,0 +1,123 @@
+# server.py
+#
+# Long-running server for the Lambda routes, for containers behind a load
+# balancer. Importing lambda_function loads the catalog and creates the S3
+# signer once per process; every request reuses them.
+#
+#   uvicorn server:app --workers 4               (ASGI)
+#   gunicorn server:wsgi_app --threads 16         (WSGI)
+#   python server.py --port 8000                  (stdlib, threaded)
+
+import argparse
+import asyncio
+import base64
+from http import HTTPStatus
+from urllib.parse import parse_qsl
+import lambda_function
+
+def _event(path, query_string, headers, body):
+    # Same event shape as an API Gateway HTTP API (payload 2.0) request
+    return {
+        'rawPath': path,
+        'rawQueryString': query_string,
+        'queryStringParameters': dict(parse_qsl(query_string)) or None,
+        'headers': headers,
+        'body': base64.b64encode(body).decode('ascii') if body else None,
+        'isBase64Encoded': bool(body),
+    }
+
+def _response_body(response):
+    body = response.get('body') or ''
+    if response.get('isBase64Encoded'):
+        return base64.b64decode(body)
+    return body.encode('utf-8')
+
+def handle(path, query_string, headers, body):
+    """
+    Run one request through the Lambda routing; returns (status, headers, body bytes).
+    """
+    response = lambda_function.lambda_handler(_event(path, query_string, headers, body), None)
+    response_headers = dict(response.get('headers') or {})
+    response_headers.setdefault('Content-Type', 'application/json')
+    return response['statusCode'], response_headers, _response_body(response)
+
+async def app(scope, receive, send):
+    """
+    ASGI application.
+    """
+    if scope['type'] == 'lifespan':
+        while True:
+            message = await receive()
+            if message['type'] == 'lifespan.startup':
+                await send({'type': 'lifespan.startup.complete'})
+            elif message['type'] == 'lifespan.shutdown':
+                await send({'type': 'lifespan.shutdown.complete'})
+                return
+    if scope['type'] != 'http':
+        return
+
+    body = b''
+    while True:
+        message = await receive()
+        body += message.get('body', b'')
+        if not message.get('more_body'):
+            break
+
+    headers = {}
+    for key, value in scope['headers']:
+        headers[key.decode('latin-1').lower()] = value.decode('latin-1')
+
+    # Signing and partition loads block, so keep them off the event loop
+    status, response_headers, response_body = await asyncio.to_thread(
+        handle, scope['path'], scope['query_string'].decode('latin-1'), headers, body,
+    )
+    await send({
+        'type': 'http.response.start',
+        'status': status,
+        'headers': [
+            (key.lower().encode('latin-1'), str(value).encode('latin-1'))
+            for key, value in response_headers.items()
+        ],
+    })
+    await send({'type': 'http.response.body', 'body': response_body})
+
+def wsgi_app(environ, start_response):
+    """
+    WSGI application.
+    """
+    headers = {
+        key[5:].replace('_', '-').lower(): value
+        for key, value in environ.items() if key.startswith('HTTP_')
+    }
+    if environ.get('CONTENT_TYPE'):
+        headers['content-type'] = environ['CONTENT_TYPE']
+    try:
+        length = int(environ.get('CONTENT_LENGTH') or 0)
+    except ValueError:
+        length = 0
+    body = environ['wsgi.input'].read(length) if length else b''
+
+    status, response_headers, response_body = handle(
+        environ.get('PATH_INFO', ''), environ.get('QUERY_STRING', ''), headers, body,
+    )
+    start_response(
+        f"{status} {HTTPStatus(status).phrase}",
+        [(key, str(value)) for key, value in response_headers.items()],
+    )
+    return [response_body]
+
+if __name__ == '__main__':
+    from socketserver import ThreadingMixIn
+    from wsgiref.simple_server import WSGIServer, make_server
+
+    class ThreadingWSGIServer(ThreadingMixIn, WSGIServer):
+        daemon_threads = True
+
+    parser = argparse.ArgumentParser(description="Serve the Lambda routes over HTTP.")
+    parser.add_argument('--host', default='0.0.0.0')
+    parser.add_argument('--port', type=int, default=8000)
+    args = parser.parse_args()
+
+    with make_server(args.host, args.port, wsgi_app, server_class=ThreadingWSGIServer) as httpd:
+        print(f"Serving on http://{args.host}:{args.port}")
+        httpd.serve_forever()
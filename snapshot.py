@@ -0,0 +1,213 @@
+# snapshot.py
+#
+# Compact, versioned catalog snapshot for the Lambda.
+#
+# Layout (all integers little-endian, every section 8-byte aligned):
+#
+#   magic           8 bytes   b'HNYSNAP\0'
+#   version         uint32
+#   header_length   uint32
+#   header          JSON describing the string table and the tables
+#   string offsets  uint32 * (count + 1)
+#   string data     UTF-8 bytes of every distinct string
+#   columns         int64 per row for integer columns,
+#                   uint32 string table index per row for text columns
+#
+# The file is memory-mapped on open and rows are only decoded when they are
+# read, so opening a snapshot costs the same regardless of its size.
+
+import json
+import mmap
+import struct
+from array import array
+
+MAGIC = b'HNYSNAP\0'
+FORMAT_VERSION = 1
+
+_PREAMBLE = struct.Struct('<8sII')
+NULL_INT = -(2 ** 63)
+NULL_STR = 0xFFFFFFFF
+SHARED_STRING_BYTES = 64
+
+def _align(offset):
+    return (offset + 7) & ~7
+
+def _column_type(values):
+    for value in values:
+        if value is None:
+            continue
+        if isinstance(value, int) and not isinstance(value, bool):
+            continue
+        return 'str'
+    return 'int'
+
+def write_snapshot(tables, snapshot_file, columns=None):
+    """
+    Write tables (table name -> list of row dicts) with their columns (table name -> column names) to a snapshot file.
+    """
+    strings = {}
+
+    def intern(value):
+        if value is None:
+            return NULL_STR
+        value = str(value)
+        index = strings.get(value)
+        if index is None:
+            index = strings[value] = len(strings)
+        return index
+
+    # Encode every column into a typed array
+    encoded = []
+    header_tables = {}
+    for table_name, rows in tables.items():
+        table_columns = (columns or {}).get(table_name)
+        if table_columns is None:
+            table_columns = list(rows[0].keys()) if rows else []
+        header_columns = []
+        for column in table_columns:
+            values = [row[column] for row in rows]
+            column_type = _column_type(values)
+            if column_type == 'int':
+                data = array('q', (NULL_INT if v is None else v for v in values))
+            else:
+                data = array('I', (intern(v) for v in values))
+            header_columns.append({'name': column, 'type': column_type})
+            encoded.append((header_columns[-1], data))
+        header_tables[table_name] = {'rows': len(rows), 'columns': header_columns}
+
+    string_bytes = [s.encode('utf-8') for s in strings]
+    string_offsets = array('I', [0])
+    for raw in string_bytes:
+        string_offsets.append(string_offsets[-1] + len(raw))
+    string_data = b''.join(string_bytes)
+
+    # Lay out sections; the header stores absolute offsets, so grow it until it fits
+    header = {'strings': {'count': len(string_bytes)}, 'tables': header_tables}
+    header_length = 0
+    while True:
+        offset = _align(_PREAMBLE.size + header_length)
+        header['strings']['offsets'] = offset
+        offset = _align(offset + len(string_offsets) * string_offsets.itemsize)
+        header['strings']['data'] = offset
+        offset = _align(offset + len(string_data))
+        for column, data in encoded:
+            column['offset'] = offset
+            offset = _align(offset + len(data) * data.itemsize)
+        header_bytes = json.dumps(header, separators=(',', ':')).encode('utf-8')
+        if len(header_bytes) <= header_length:
+            break
+        header_length = len(header_bytes)
+    header_bytes = header_bytes.ljust(header_length, b' ')
+
+    with open(snapshot_file, 'wb') as f:
+        f.write(_PREAMBLE.pack(MAGIC, FORMAT_VERSION, header_length))
+        f.write(header_bytes)
+        for position, payload in [
+            (header['strings']['offsets'], string_offsets.tobytes()),
+            (header['strings']['data'], string_data),
+        ] + [(column['offset'], data.tobytes()) for column, data in encoded]:
+            f.write(b'\0' * (position - f.tell()))
+            f.write(payload)
+
+class Snapshot:
+    """
+    Read-only, memory-mapped view of a snapshot file.
+    """
+
+    def __init__(self, snapshot_file):
+        with open(snapshot_file, 'rb') as f:
+            self._mmap = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, version, header_length = _PREAMBLE.unpack_from(self._mmap, 0)
+        if magic != MAGIC:
+            raise ValueError(f"{snapshot_file} is not a catalog snapshot")
+        if version != FORMAT_VERSION:
+            raise ValueError(f"Unsupported snapshot version {version} in {snapshot_file}")
+        header = json.loads(self._mmap[_PREAMBLE.size:_PREAMBLE.size + header_length])
+
+        view = memoryview(self._mmap)
+        strings = header['strings']
+        count = strings['count']
+        self._string_offsets = view[strings['offsets']:strings['offsets'] + 4 * (count + 1)].cast('I')
+        self._string_data = view[strings['data']:strings['data'] + (self._string_offsets[count] if count else 0)]
+        self._string_cache = {}
+
+        self._tables = {}
+        for table_name, table in header['tables'].items():
+            columns = {}
+            for column in table['columns']:
+                itemsize = 8 if column['type'] == 'int' else 4
+                start = column['offset']
+                raw = view[start:start + itemsize * table['rows']]
+                columns[column['name']] = (column['type'], raw.cast('q' if column['type'] == 'int' else 'I'))
+            self._tables[table_name] = Table(self, table['rows'], columns)
+
+    def string(self, index):
+        if index == NULL_STR:
+            return None
+        value = self._string_cache.get(index)
+        if value is None:
+            start, end = self._string_offsets[index], self._string_offsets[index + 1]
+            value = str(self._string_data[start:end], 'utf-8')
+            # Share short repeated strings (themes, genders, keys); long texts stay in the map
+            if end - start <= SHARED_STRING_BYTES:
+                self._string_cache[index] = value
+        return value
+
+    def keys(self):
+        return self._tables.keys()
+
+    def __contains__(self, table_name):
+        return table_name in self._tables
+
+    def __getitem__(self, table_name):
+        return self._tables[table_name]
+
+class Table:
+    """
+    Rows of one snapshot table, decoded into dicts on access.
+    """
+
+    def __init__(self, snapshot, rows, columns):
+        self._snapshot = snapshot
+        self._rows = rows
+        self._columns = columns
+
+    def __len__(self):
+        return self._rows
+
+    def _value(self, column_type, data, index):
+        value = data[index]
+        if column_type == 'int':
+            return None if value == NULL_INT else value
+        return self._snapshot.string(value)
+
+    def __getitem__(self, index):
+        if index < 0:
+            index += self._rows
+        if not 0 <= index < self._rows:
+            raise IndexError('snapshot row index out of range')
+        return {
+            name: self._value(column_type, data, index)
+            for name, (column_type, data) in self._columns.items()
+        }
+
+    def __iter__(self):
+        names = list(self._columns)
+        for values in zip(*(self.column(name) for name in names)):
+            yield dict(zip(names, values))
+
+    def column(self, name):
+        """
+        Decode a single column without materializing whole rows.
+        """
+        column_type, data = self._columns[name]
+        if column_type == 'int':
+            return [None if value == NULL_INT else value for value in data]
+        string = self._snapshot.string
+        return [string(value) for value in data]
+
+def open_snapshot(snapshot_file):
+    """
+    Open a snapshot file for lazy reading.
+    """
+    return Snapshot(snapshot_file)
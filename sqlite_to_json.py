@@ -1,9 +1,38 @@
 # sqlite_to_json.py
 
+import argparse
+import os
+import re
+import shutil
 import sqlite3
 import json
+from datetime import datetime, timezone
+from database import prune_change_log
+from snapshot import write_snapshot
 
-def sqlite_to_json(db_file, json_file):
+# Rows fetched from SQLite per round trip by the streaming exporter
+EXPORT_BATCH_SIZE = int(os.environ.get('EXPORT_BATCH_SIZE', '5000'))
+# Earlier partitioned export versions kept next to the current one
+CATALOG_KEEP_VERSIONS = int(os.environ.get('CATALOG_KEEP_VERSIONS', '5'))
+
+# Catalog key and exported columns of every table
+CATALOG_TABLES = {
+    'language': ('languages', ['id', 'name', 'code']),
+    'voice': ('voices', ['id', 'name', 'elevenlabs_voice_id', 'gender', 'language_id']),
+    'name': ('names', ['id', 'name', 'gender', 'language_id']),
+    'category': ('categories', ['id', 'name', 'language_id']),
+    'personal': ('personal', ['id', 'name_id', 'text', 'type', 'audio_file']),
+    'general': ('general', ['id', 'category_id', 'theme_name', 'topic_name', 'text', 'audio_file', 'symbols', 'gender']),
+}
+
+# Columns of every snapshot table, so empty tables keep theirs
+SNAPSHOT_COLUMNS = {key: columns for key, columns in CATALOG_TABLES.values()}
+SNAPSHOT_COLUMNS['topics'] = ['theme_name']
+
+def fetch_catalog(db_file):
+    """
+    Read every catalog table from the SQLite database into a dict of row lists.
+    """
     conn = sqlite3.connect(db_file)
     cursor = conn.cursor()
 
@@ -90,9 +119,375 @@ def sqlite_to_json(db_file, json_file):
     # Close the connection
     conn.close()
 
+    return data
+
+def _last_change_id(cursor):
+    try:
+        change_id = cursor.execute("SELECT COALESCE(MAX(id), 0) FROM change_log").fetchone()[0]
+    except sqlite3.OperationalError:
+        return None  # Database predates change tracking
+    # The log may be pruned empty; AUTOINCREMENT keeps the high-water mark
+    sequence = cursor.execute("SELECT seq FROM sqlite_sequence WHERE name = 'change_log'").fetchone()
+    return max(change_id, sequence[0] if sequence else 0)
+
+def _stream_batches(cursor, query, params=(), batch_size=EXPORT_BATCH_SIZE):
+    # Yield lists of row dicts, holding at most one batch of rows in memory
+    cursor.execute(query, params)
+    columns = [column[0] for column in cursor.description]
+    while True:
+        rows = cursor.fetchmany(batch_size)
+        if not rows:
+            return
+        yield [dict(zip(columns, row)) for row in rows]
+
+def write_json_stream(f, sections, compact=False):
+    """
+    Write a JSON object whose values may be iterators of row batches; non-compact output matches json.dump(indent=4).
+    """
+    if compact:
+        dump = lambda value: json.dumps(value, ensure_ascii=False, separators=(',', ':'))
+        newline, indent, colon = '', '', ':'
+    else:
+        dump = lambda value: json.dumps(value, ensure_ascii=False, indent=4)
+        newline, indent, colon = '\n', ' ' * 4, ': '
+
+    f.write('{')
+    for index, (key, value) in enumerate(sections):
+        f.write((',' if index else '') + newline + indent + json.dumps(key, ensure_ascii=False) + colon)
+        if not hasattr(value, '__next__'):
+            f.write(dump(value))
+            continue
+        empty = True
+        for batch in value:
+            if not batch:
+                continue
+            # Drop the list brackets and nest the rows one level deeper
+            rows = dump(batch)[1:-1].strip('\n')
+            if not compact:
+                rows = indent + rows.replace('\n', '\n' + indent)
+            f.write(('[' if empty else ',') + newline + rows)
+            empty = False
+        f.write('[]' if empty else newline + indent + ']')
+    f.write(newline + '}')
+
+def sqlite_to_json(db_file, json_file, compact=False, batch_size=EXPORT_BATCH_SIZE):
+    """
+    Export the catalog to JSON with streamed rows, then prune the exported change log entries.
+    """
+    conn = sqlite3.connect(db_file)
+    cursor = conn.cursor()
+    # One read transaction, so all tables and the change id come from the same state
+    cursor.execute("BEGIN")
+    change_id = _last_change_id(cursor)
+
+    def table_rows(table_name, columns):
+        return _stream_batches(cursor, f"SELECT {', '.join(columns)} FROM {table_name}", batch_size=batch_size)
+
+    sections = [(key, table_rows(table_name, columns)) for table_name, (key, columns) in CATALOG_TABLES.items()]
+    sections.append(('change_id', change_id))
+
     # Write data to JSON file
-    with open(json_file, 'w', encoding='utf-8') as f:
-        json.dump(data, f, ensure_ascii=False, indent=4)
+    try:
+        with open(json_file + '.tmp', 'w', encoding='utf-8') as f:
+            write_json_stream(f, sections, compact=compact)
+        os.replace(json_file + '.tmp', json_file)
+        conn.rollback()
+        if change_id is not None:
+            _prune_exported_changes(conn, change_id)
+    finally:
+        conn.close()
+
+def _prune_exported_changes(conn, change_id):
+    # Deltas are computed against the JSON export, so the changes it already
+    # contains are not needed any more
+    try:
+        prune_change_log(conn, change_id)
+    except sqlite3.OperationalError as e:
+        print(f"Change log not pruned, retrying after the next export: {e}")
+
+def sqlite_to_snapshot(db_file, snapshot_file):
+    """
+    Export the catalog as a compact binary snapshot (see snapshot.py).
+    """
+    write_snapshot(fetch_catalog(db_file), snapshot_file, SNAPSHOT_COLUMNS)
+
+def export_delta(db_file, since_change_id):
+    """
+    Collect the rows changed after since_change_id as {'base_change_id', 'change_id', 'upserts', 'deletes'}.
+    """
+    conn = sqlite3.connect(db_file)
+    cursor = conn.cursor()
+    cursor.execute("BEGIN")
+
+    # Exported entries are pruned (see sqlite_to_json), so a base older than
+    # the first remaining entry would silently miss changes
+    first_change_id = cursor.execute("SELECT MIN(id) FROM change_log").fetchone()[0]
+    if first_change_id is None:
+        sequence = cursor.execute("SELECT seq FROM sqlite_sequence WHERE name = 'change_log'").fetchone()
+        first_change_id = (sequence[0] if sequence else 0) + 1
+    if since_change_id + 1 < first_change_id:
+        conn.close()
+        raise ValueError(f"Changes after {since_change_id} were pruned from the change log; run a full export")
+
+    cursor.execute(
+        "SELECT table_name, row_id, MAX(id) FROM change_log WHERE id > ? GROUP BY table_name, row_id",
+        (since_change_id,),
+    )
+    changes = cursor.fetchall()
+    change_id = max((change[2] for change in changes), default=since_change_id)
+
+    delta = {'base_change_id': since_change_id, 'change_id': change_id, 'upserts': {}, 'deletes': {}}
+    changed_ids = {}
+    for table_name, row_id, _ in changes:
+        changed_ids.setdefault(table_name, []).append(row_id)
+
+    for table_name, row_ids in changed_ids.items():
+        key, columns = CATALOG_TABLES[table_name]
+        rows = []
+        for start in range(0, len(row_ids), 500):
+            batch = row_ids[start:start + 500]
+            rows.extend(_fetch_rows(cursor, f"""
+                SELECT {', '.join(columns)} FROM {table_name}
+                WHERE id IN ({', '.join('?' * len(batch))})
+            """, batch))
+        existing = {row['id'] for row in rows}
+        if rows:
+            delta['upserts'][key] = rows
+        deleted = sorted(set(row_ids) - existing)
+        if deleted:
+            delta['deletes'][key] = deleted
+
+    conn.close()
+    return delta
+
+def merge_delta(data, delta):
+    """
+    Apply a delta from export_delta to a full export (as written by sqlite_to_json).
+    """
+    if data.get('change_id') != delta['base_change_id']:
+        raise ValueError(
+            f"Delta starts at change {delta['base_change_id']} but the export is at change {data.get('change_id')}"
+        )
+    for key, _ in CATALOG_TABLES.values():
+        upserts = {row['id']: row for row in delta['upserts'].get(key, [])}
+        deletes = set(delta['deletes'].get(key, []))
+        if not upserts and not deletes:
+            continue
+        rows = []
+        for row in data[key]:
+            if row['id'] in deletes:
+                continue
+            rows.append(upserts.pop(row['id'], row))
+        rows.extend(upserts.values())
+        data[key] = rows
+    data['change_id'] = delta['change_id']
+    return data
+
+def sqlite_to_delta(db_file, json_file, delta_file, apply=False):
+    """
+    Write the changes since the export in json_file to delta_file, and
+    optionally merge them into json_file and prune the merged changes.
+    """
+    with open(json_file, 'r', encoding='utf-8') as f:
+        raw = f.read()
+    data = json.loads(raw)
+    # Merged output keeps the layout of the base export (see write_json_stream)
+    compact = not raw.startswith('{\n')
+    if data.get('change_id') is None:
+        raise ValueError(f"{json_file} has no change_id; run a full export first")
+
+    delta = export_delta(db_file, data['change_id'])
+    with open(delta_file, 'w', encoding='utf-8') as f:
+        json.dump(delta, f, ensure_ascii=False, separators=(',', ':'))
+
+    if apply:
+        merge_delta(data, delta)
+        with open(json_file + '.tmp', 'w', encoding='utf-8') as f:
+            # Row lists go in as one batch, so they are nested like a streamed export
+            sections = [(key, iter([value]) if isinstance(value, list) else value) for key, value in data.items()]
+            write_json_stream(f, sections, compact=compact)
+        os.replace(json_file + '.tmp', json_file)
+        conn = sqlite3.connect(db_file)
+        try:
+            _prune_exported_changes(conn, delta['change_id'])
+        finally:
+            conn.close()
+    return delta
+
+def _fetch_rows(cursor, query, params=()):
+    cursor.execute(query, params)
+    columns = [column[0] for column in cursor.description]
+    return [dict(zip(columns, row)) for row in cursor.fetchall()]
+
+def _write_catalog_file(tables, path, output_format):
+    if output_format == 'snapshot':
+        write_snapshot(tables, path, SNAPSHOT_COLUMNS)
+    else:
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump(tables, f, ensure_ascii=False, separators=(',', ':'))
+
+def sqlite_to_partitions(db_file, output_dir, output_format='json'):
+    """
+    Export the catalog as a versioned core file plus one partition per language, then swap manifest.json.
+    """
+    version = datetime.now(timezone.utc).strftime('%Y%m%dT%H%M%S%fZ')
+    os.makedirs(os.path.join(output_dir, version), exist_ok=True)
+    extension = 'snap' if output_format == 'snapshot' else 'json'
+
+    conn = sqlite3.connect(db_file)
+    cursor = conn.cursor()
+    # One read transaction, so the core and every partition come from the same state
+    cursor.execute("BEGIN")
+
+    core = {
+        'languages': _fetch_rows(cursor, "SELECT id, name, code FROM language"),
+        'voices': _fetch_rows(cursor, "SELECT id, name, elevenlabs_voice_id, gender, language_id FROM voice"),
+        'names': _fetch_rows(cursor, "SELECT id, name, gender, language_id FROM name"),
+        'categories': _fetch_rows(cursor, "SELECT id, name, language_id FROM category"),
+        'topics': _fetch_rows(cursor, "SELECT theme_name FROM general GROUP BY theme_name ORDER BY MIN(id)"),
+    }
+    core_file = f"{version}/core.{extension}"
+    _write_catalog_file(core, os.path.join(output_dir, core_file), output_format)
+
+    partitions = {}
+    for language in core['languages']:
+        partition = {
+            'personal': _fetch_rows(cursor, """
+                SELECT personal.id, personal.name_id, personal.text, personal.type, personal.audio_file
+                FROM personal
+                JOIN name ON personal.name_id = name.id
+                WHERE name.language_id = ?
+            """, (language['id'],)),
+            'general': _fetch_rows(cursor, """
+                SELECT general.id, general.category_id, general.theme_name, general.topic_name,
+                       general.text, general.audio_file, general.symbols, general.gender
+                FROM general
+                JOIN category ON general.category_id = category.id
+                WHERE category.language_id = ?
+            """, (language['id'],)),
+        }
+        partition_file = f"{version}/lang-{language['id']}.{extension}"
+        _write_catalog_file(partition, os.path.join(output_dir, partition_file), output_format)
+        partitions[str(language['id'])] = partition_file
+
+    conn.close()
+
+    manifest = {'version': version, 'format': output_format, 'core': core_file, 'partitions': partitions}
+    _write_manifest(output_dir, manifest)
+    return manifest
+
+# Name of the subdirectory of one export version
+_VERSION_DIR = re.compile(r'^\d{8}T\d{12}Z$')
+
+def _write_manifest(output_dir, manifest):
+    manifest_file = os.path.join(output_dir, 'manifest.json')
+    with open(manifest_file + '.tmp', 'w', encoding='utf-8') as f:
+        json.dump(manifest, f, indent=4)
+    os.replace(manifest_file + '.tmp', manifest_file)
+
+    # Keep the newest earlier versions for readers that have not picked up the
+    # new manifest yet, and remove the rest
+    versions = sorted(
+        entry for entry in os.listdir(output_dir)
+        if _VERSION_DIR.match(entry) and entry != manifest['version']
+    )
+    for entry in versions[:max(len(versions) - CATALOG_KEEP_VERSIONS, 0)]:
+        shutil.rmtree(os.path.join(output_dir, entry), ignore_errors=True)
+
+# Rows the Lambda can actually play
+_PLAYABLE = "{table}.text IS NOT NULL AND {table}.text != '' AND {table}.audio_file IS NOT NULL AND {table}.audio_file != ''"
+
+def sqlite_to_serving(db_file, output_dir):
+    """
+    Export JSON partitions of playable greeting keys per name and audio buckets per (theme, gender).
+    """
+    version = datetime.now(timezone.utc).strftime('%Y%m%dT%H%M%S%fZ')
+    os.makedirs(os.path.join(output_dir, version), exist_ok=True)
+
+    conn = sqlite3.connect(db_file)
+    cursor = conn.cursor()
+    cursor.execute("BEGIN")
+
+    core = {
+        'languages': _fetch_rows(cursor, "SELECT id, name, code FROM language"),
+        'voices': _fetch_rows(cursor, "SELECT id, name, elevenlabs_voice_id, gender, language_id FROM voice"),
+        'names': _fetch_rows(cursor, "SELECT id, name, gender, language_id FROM name"),
+        'categories': _fetch_rows(cursor, "SELECT id, name, language_id FROM category"),
+        'topics': _fetch_rows(cursor, f"""
+            SELECT general.theme_name FROM general
+            JOIN category ON general.category_id = category.id
+            JOIN language ON category.language_id = language.id
+            WHERE general.theme_name IS NOT NULL AND {_PLAYABLE.format(table='general')}
+            GROUP BY general.theme_name ORDER BY MIN(general.id)
+        """),
+    }
+    core_file = f"{version}/core.json"
+    _write_catalog_file(core, os.path.join(output_dir, core_file), 'json')
+
+    partitions = {str(language['id']): {'greetings': {}, 'buckets': {}} for language in core['languages']}
+
+    # First playable greeting per name (SQLite takes the bare columns from the MIN(id) row)
+    cursor.execute(f"""
+        SELECT name.language_id, personal.name_id, personal.audio_file, MIN(personal.id)
+        FROM personal
+        JOIN name ON personal.name_id = name.id
+        JOIN language ON name.language_id = language.id
+        WHERE personal.type = 'greeting' AND {_PLAYABLE.format(table='personal')}
+        GROUP BY personal.name_id
+    """)
+    for language_id, name_id, audio_file, _ in cursor:
+        partitions[str(language_id)]['greetings'][str(name_id)] = audio_file
+
+    # Distinct playable audio keys per (language, theme, gender) in first-seen order
+    cursor.execute(f"""
+        SELECT category.language_id, general.theme_name, general.gender, general.audio_file
+        FROM general
+        JOIN category ON general.category_id = category.id
+        JOIN language ON category.language_id = language.id
+        WHERE general.theme_name IS NOT NULL AND {_PLAYABLE.format(table='general')}
+        GROUP BY category.language_id, general.theme_name, general.gender, general.audio_file
+        ORDER BY MIN(general.id)
+    """)
+    for language_id, theme_name, gender, audio_file in cursor:
+        buckets = partitions[str(language_id)]['buckets']
+        buckets.setdefault(theme_name, {}).setdefault(gender, []).append(audio_file)
+
+    conn.close()
+
+    partition_files = {}
+    for language_id, partition in partitions.items():
+        partition_file = f"{version}/lang-{language_id}.json"
+        _write_catalog_file(partition, os.path.join(output_dir, partition_file), 'json')
+        partition_files[language_id] = partition_file
+
+    manifest = {'version': version, 'format': 'json', 'layout': 'serving', 'core': core_file, 'partitions': partition_files}
+    _write_manifest(output_dir, manifest)
+    return manifest
 
 if __name__ == '__main__':
-    sqlite_to_json('mydatabase.db', 'data.json')
+    parser = argparse.ArgumentParser(description="Export the dashboard database for the Lambda.")
+    parser.add_argument('db_file', nargs='?', default='mydatabase.db')
+    parser.add_argument('output', nargs='?')
+    parser.add_argument('--format', choices=['json', 'snapshot'], default='json')
+    parser.add_argument('--compact', action='store_true', help="Write JSON without indentation")
+    parser.add_argument('--partitioned', action='store_true', help="Write a core file plus one partition per language into the output directory")
+    parser.add_argument('--serving', action='store_true', help="Write a partitioned export with precomputed greeting keys and audio buckets")
+    parser.add_argument('--incremental', metavar='DELTA_FILE', help="Write only the rows changed since the JSON export in output to DELTA_FILE")
+    parser.add_argument('--apply', action='store_true', help="With --incremental, also merge the delta into the JSON export")
+    args = parser.parse_args()
+    if args.serving and args.format != 'json':
+        parser.error("--serving only writes JSON partitions; drop --format snapshot")
+
+    if args.incremental:
+        delta = sqlite_to_delta(args.db_file, args.output or 'data.json', args.incremental, apply=args.apply)
+        changed = sum(len(rows) for rows in delta['upserts'].values())
+        deleted = sum(len(ids) for ids in delta['deletes'].values())
+        print(f"Changes {delta['base_change_id']}..{delta['change_id']}: {changed} changed, {deleted} deleted rows")
+    elif args.serving:
+        sqlite_to_serving(args.db_file, args.output or 'catalog')
+    elif args.partitioned:
+        sqlite_to_partitions(args.db_file, args.output or 'catalog', args.format)
+    elif args.format == 'snapshot':
+        sqlite_to_snapshot(args.db_file, args.output or 'data.snap')
+    else:
+        sqlite_to_json(args.db_file, args.output or 'data.json', compact=args.compact)
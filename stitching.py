@@ -0,0 +1,167 @@
+# stitching.py
+#
+# Server-side stitching of a session (greeting + sampled clips) into one MP3.
+# All clips come from tts.py with the same output format (mp3_22050_32), so
+# the MPEG frames can simply be concatenated once the per-file metadata
+# (ID3 tags and the Xing/Info/VBRI header frame) is removed.
+
+import hashlib
+import os
+import shutil
+import threading
+from collections import OrderedDict
+
+# Side information length by (MPEG-1, mono) for locating the Xing/Info tag
+_SIDE_INFO_LENGTH = {
+    (True, False): 32,
+    (True, True): 17,
+    (False, False): 17,
+    (False, True): 9,
+}
+
+def _skip_id3v2(data):
+    if data[:3] != b'ID3' or len(data) < 10:
+        return 0
+    size = (data[6] << 21) | (data[7] << 14) | (data[8] << 7) | data[9]
+    footer = 10 if data[5] & 0x10 else 0
+    return 10 + size + footer
+
+def _is_vbr_header_frame(data, offset):
+    # Frame header: 11 sync bits, then version, layer, ..., channel mode
+    if len(data) < offset + 40 or data[offset] != 0xFF or data[offset + 1] & 0xE0 != 0xE0:
+        return False
+    mpeg1 = (data[offset + 1] >> 3) & 0x03 == 0x03
+    mono = (data[offset + 3] >> 6) & 0x03 == 0x03
+    tag_offset = offset + 4 + _SIDE_INFO_LENGTH[(mpeg1, mono)]
+    return (
+        data[tag_offset:tag_offset + 4] in (b'Xing', b'Info')
+        or data[offset + 36:offset + 40] == b'VBRI'
+    )
+
+def _frame_length(data, offset):
+    # Layer III frame length from the header; None when the header is invalid
+    if len(data) < offset + 4 or data[offset] != 0xFF or data[offset + 1] & 0xE0 != 0xE0:
+        return None
+    version = (data[offset + 1] >> 3) & 0x03
+    bitrate_index = (data[offset + 2] >> 4) & 0x0F
+    sample_rate_index = (data[offset + 2] >> 2) & 0x03
+    padding = (data[offset + 2] >> 1) & 0x01
+    if version == 0x01 or bitrate_index in (0, 15) or sample_rate_index == 3:
+        return None
+    if version == 0x03:
+        bitrates = [0, 32, 40, 48, 56, 64, 80, 96, 112, 128, 160, 192, 224, 256, 320]
+        sample_rates = [44100, 48000, 32000]
+        coefficient = 144
+    else:
+        bitrates = [0, 8, 16, 24, 32, 40, 48, 56, 64, 80, 96, 112, 128, 144, 160]
+        sample_rates = [22050, 24000, 16000] if version == 0x02 else [11025, 12000, 8000]
+        coefficient = 72
+    return coefficient * bitrates[bitrate_index] * 1000 // sample_rates[sample_rate_index] + padding
+
+def strip_mp3_metadata(data):
+    """
+    Return only the audio frames of an MP3 file.
+    """
+    start = _skip_id3v2(data)
+    end = len(data)
+    if end - start >= 128 and data[end - 128:end - 125] == b'TAG':
+        end -= 128
+    if _is_vbr_header_frame(data, start):
+        start += _frame_length(data, start) or 0
+    return data[start:end]
+
+def stitch_mp3(clips):
+    """
+    Concatenate MP3 files that share one encoding format.
+    """
+    return b''.join(strip_mp3_metadata(clip) for clip in clips)
+
+class StitchedAudioStore:
+    """
+    Stitched session files in S3 keyed by their clips, with bounded local caches of clips and known keys.
+    """
+
+    def __init__(self, s3_client, bucket, prefix='stitched/', local_dir='/tmp/stitched',
+                 max_clip_bytes=128 * 1024 * 1024, max_known_keys=10000):
+        self.s3_client = s3_client
+        self.bucket = bucket
+        self.prefix = prefix
+        self.local_dir = local_dir
+        self.max_clip_bytes = max_clip_bytes
+        self.max_known_keys = max_known_keys
+        self._known = OrderedDict()
+        # Cached clip files and their sizes, least recently used first
+        self._clips = OrderedDict()
+        self._clip_bytes = 0
+        self._lock = threading.Lock()
+        # Files left by an earlier process are not in the index, so start empty
+        shutil.rmtree(os.path.join(local_dir, 'clips'), ignore_errors=True)
+
+    def key_for(self, audio_keys):
+        digest = hashlib.sha256('\n'.join(audio_keys).encode('utf-8')).hexdigest()
+        return f"{self.prefix}{digest}.mp3"
+
+    def _remember(self, key):
+        with self._lock:
+            self._known[key] = None
+            self._known.move_to_end(key)
+            while len(self._known) > self.max_known_keys:
+                self._known.popitem(last=False)
+
+    def _exists(self, key):
+        with self._lock:
+            if key in self._known:
+                self._known.move_to_end(key)
+                return True
+        try:
+            self.s3_client.head_object(Bucket=self.bucket, Key=key)
+        except self.s3_client.exceptions.ClientError as e:
+            # Only a missing object means "stitch it"; access errors and throttling propagate
+            if e.response.get('Error', {}).get('Code') in ('404', 'NoSuchKey', 'NotFound'):
+                return False
+            raise
+        self._remember(key)
+        return True
+
+    def _fetch_clip(self, key):
+        path = os.path.join(self.local_dir, 'clips', key.replace('/', '_'))
+        with self._lock:
+            cached = path in self._clips
+            if cached:
+                self._clips.move_to_end(path)
+        if cached:
+            try:
+                with open(path, 'rb') as f:
+                    return f.read()
+            except FileNotFoundError:
+                pass  # Evicted by another thread in the meantime
+
+        data = self.s3_client.get_object(Bucket=self.bucket, Key=key)['Body'].read()
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path + '.part', 'wb') as f:
+            f.write(data)
+        os.replace(path + '.part', path)
+        with self._lock:
+            self._clip_bytes += len(data) - self._clips.get(path, 0)
+            self._clips[path] = len(data)
+            self._clips.move_to_end(path)
+            while self._clip_bytes > self.max_clip_bytes and len(self._clips) > 1:
+                evicted, size = self._clips.popitem(last=False)
+                self._clip_bytes -= size
+                try:
+                    os.remove(evicted)
+                except FileNotFoundError:
+                    pass
+        return data
+
+    def get_or_create(self, audio_keys):
+        """
+        Return the S3 key of the stitched file for audio_keys, creating it if needed.
+        """
+        key = self.key_for(audio_keys)
+        if self._exists(key):
+            return key
+        body = stitch_mp3([self._fetch_clip(audio_key) for audio_key in audio_keys])
+        self.s3_client.put_object(Bucket=self.bucket, Key=key, Body=body, ContentType='audio/mpeg')
+        self._remember(key)
+        return key
@@ -0,0 +1,24 @@
+from database import (
+    MIGRATIONS, check_query_plans, create_connection, execute_batch, execute_query, fetch_all, migrate, schema_version,
+)
+
+def test_hot_queries_use_their_indexes(tmp_path):
+    conn = create_connection(str(tmp_path / 'catalog.db'))
+    migrate(conn)
+    assert schema_version(conn) == MIGRATIONS[-1][0]
+    assert check_query_plans(conn) == []
+    conn.close()
+
+def test_batch_reports_unbindable_and_null_rows_per_row(tmp_path):
+    conn = create_connection(str(tmp_path / 'catalog.db'))
+    migrate(conn)
+    execute_query(conn, "INSERT INTO language (name, code) VALUES ('English', 'en')")
+    result = execute_batch(
+        conn, "INSERT INTO name (name, gender, language_id) VALUES (?, ?, ?) ON CONFLICT DO NOTHING",
+        [('James', 'male', 1), (float('nan'), 'male', 1), ('Anna', object(), 1), ('James', 'male', 1), ('Olga', 'female', 1)],
+    )
+    assert result.changed == 2
+    assert result.skipped == [3]
+    assert [index for index, _ in result.failed] == [1, 2]
+    assert fetch_all(conn, "SELECT name FROM name ORDER BY id") == [('James',), ('Olga',)]
+    conn.close()
@@ -0,0 +1,33 @@
+import json
+import os
+
+import pytest
+
+pytest.importorskip('boto3')
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+@pytest.fixture
+def lambda_function(monkeypatch):
+    # The catalog is loaded from data.json in the repository root on import
+    monkeypatch.chdir(ROOT)
+    monkeypatch.setenv('AWS_DEFAULT_REGION', 'us-east-1')
+    import lambda_function
+    return lambda_function
+
+def batch_messages(lambda_function, playlist_requests):
+    response = lambda_function.batch_simulate_api_call(playlist_requests)
+    assert response['statusCode'] == 200
+    return [playlist.get('message') for playlist in json.loads(response['body'])['playlists']]
+
+@pytest.mark.parametrize('rotation', [True, False, -1, '1', 1.5, None])
+def test_batch_rejects_invalid_rotation(lambda_function, rotation):
+    messages = batch_messages(lambda_function, [{'selectedName': '1', 'selectedTopic': 'x', 'rotation': rotation}])
+    assert messages == ['Invalid rotation']
+
+def test_batch_rejects_non_dict_requests(lambda_function):
+    assert batch_messages(lambda_function, ['1']) == ['Invalid request']
+
+@pytest.mark.parametrize('playlist_requests', [[], {}, None])
+def test_batch_rejects_empty_or_non_list_body(lambda_function, playlist_requests):
+    assert lambda_function.batch_simulate_api_call(playlist_requests)['statusCode'] == 400
@@ -0,0 +1,50 @@
+import json
+
+import pytest
+
+from database import create_connection, execute_query, migrate
+from sqlite_to_json import sqlite_to_delta, sqlite_to_json
+
+@pytest.fixture
+def db_file(tmp_path):
+    db_file = str(tmp_path / 'catalog.db')
+    conn = create_connection(db_file)
+    migrate(conn)
+    execute_query(conn, "INSERT INTO language (name, code) VALUES ('English', 'en')")
+    execute_query(conn, "INSERT INTO name (name, gender, language_id) VALUES ('James', 'male', 1)")
+    conn.close()
+    return db_file
+
+def rename(db_file, name):
+    conn = create_connection(db_file)
+    execute_query(conn, "UPDATE name SET name = ? WHERE id = 1", (name,))
+    conn.close()
+
+@pytest.mark.parametrize('compact', [False, True])
+def test_incremental_export_after_repeated_full_exports(db_file, tmp_path, compact):
+    json_file = str(tmp_path / 'data.json')
+    sqlite_to_json(db_file, json_file, compact=compact)
+    rename(db_file, 'Jim')
+    # The second export prunes the change log empty but must keep its change id
+    sqlite_to_json(db_file, json_file, compact=compact)
+    with open(json_file, 'r', encoding='utf-8') as f:
+        assert json.load(f)['change_id'] == 3
+
+    rename(db_file, 'Jimmy')
+    delta = sqlite_to_delta(db_file, json_file, str(tmp_path / 'delta.json'), apply=True)
+    assert (delta['base_change_id'], delta['change_id']) == (3, 4)
+    assert delta['upserts'] == {'names': [{'id': 1, 'name': 'Jimmy', 'gender': 'male', 'language_id': 1}]}
+
+    # The merged file is byte-identical to a full export in the same format
+    full_file = str(tmp_path / 'full.json')
+    sqlite_to_json(db_file, full_file, compact=compact)
+    with open(json_file, 'r', encoding='utf-8') as merged, open(full_file, 'r', encoding='utf-8') as full:
+        assert merged.read() == full.read()
+
+def test_incremental_export_rejects_a_pruned_base(db_file, tmp_path):
+    old_file = str(tmp_path / 'old.json')
+    sqlite_to_json(db_file, old_file)
+    rename(db_file, 'Jim')
+    sqlite_to_json(db_file, str(tmp_path / 'data.json'))
+    with pytest.raises(ValueError, match="pruned"):
+        sqlite_to_delta(db_file, old_file, str(tmp_path / 'delta.json'))
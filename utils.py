@@ -1,4 +1,9 @@
+import sqlite3
 import streamlit as st
+from database import count_dependents, delete_cascade, fetch_page
+
+# Rows per page of the list views
+LIST_PAGE_SIZE = 50
 
 def clear_form_states():
     """
@@ -10,3 +15,131 @@ def clear_form_states():
     st.session_state['update_id'] = None
     st.session_state['current_view'] = None
     st.session_state['show_category_page'] = False
+    st.session_state['pending_delete'] = None
+    st.session_state['list_pages'] = {}
+
+# How the rows of each table are called in delete confirmations
+DEPENDENT_LABELS = {
+    'voice': 'voices',
+    'name': 'names',
+    'category': 'categories',
+    'personal': 'personal messages',
+    'general': 'themes and topics',
+}
+
+def confirm_delete(conn, table, row_id, label):
+    """
+    Delete a row with the rows referencing it, after confirmation; True once deleted.
+    """
+    dependents = count_dependents(conn, table, row_id)
+    if dependents:
+        st.warning(
+            f"Deleting {label} also deletes "
+            + ", ".join(f"{count} {DEPENDENT_LABELS[child]}" for child, count in dependents.items()) + "."
+        )
+        col1, col2 = st.columns(2)
+        if col2.button("Cancel", key=f"cancel_delete_{table}_{row_id}"):
+            st.session_state['pending_delete'] = None
+            st.rerun()
+        if not col1.button("Confirm Delete", key=f"confirm_delete_{table}_{row_id}"):
+            return False
+    try:
+        delete_cascade(conn, table, row_id)
+    except sqlite3.IntegrityError:
+        # Something referencing the row was added meanwhile
+        st.error(f"Could not delete {label}, please try again.")
+        return False
+    st.session_state['pending_delete'] = None
+    return True
+
+def show_batch_problems(result, labels, kind, limit=10):
+    """
+    Warn about the rows an execute_batch call skipped as duplicates or rejected.
+    """
+    if result.skipped:
+        shown = ', '.join(str(labels[index]) for index in result.skipped[:limit])
+        more = f" and {len(result.skipped) - limit} more" if len(result.skipped) > limit else ''
+        st.warning(f"Skipped {len(result.skipped)} duplicate {kind}: {shown}{more}")
+    for index, error in result.failed[:limit]:
+        st.warning(f"Skipped {labels[index]}: {error}")
+    if len(result.failed) > limit:
+        st.warning(f"Skipped {len(result.failed) - limit} more invalid {kind}.")
+
+def show_query_log(log, cache_stats=None):
+    """
+    Sidebar panel with the queries of the current rerun, grouped by query text,
+    and the reference cache's hit/miss counts.
+    """
+    with st.sidebar.expander(f"Queries: {len(log.entries)} in {log.total_ms():.1f} ms"):
+        if cache_stats:
+            st.caption(
+                f"Reference cache: {cache_stats['hits']} hits, {cache_stats['misses']} misses, "
+                f"{cache_stats['invalidations']} invalidations"
+            )
+        summary = log.summary()
+        repeated = [stats for stats in summary if stats['count'] > 1]
+        if repeated:
+            st.warning(f"{len(repeated)} queries ran more than once in this rerun.")
+        st.dataframe(summary, hide_index=True)
+
+def paginated_grid(conn, key, view, page_size=LIST_PAGE_SIZE):
+    """
+    Render one keyset-paginated page of `view` as a single-row-select grid and return the selected (id, *columns) row or None.
+    """
+    col_search, col_sort, col_order = st.columns([3, 2, 1])
+    search = col_search.text_input("Search", key=f"{key}_search").strip()
+    sort_label = col_sort.selectbox("Sort by", list(view['sort']), key=f"{key}_sort")
+    descending = col_order.checkbox("Descending", key=f"{key}_descending")
+
+    where, params = [], []
+    if search:
+        where.append(f"{view['search']} LIKE ?")
+        params.append(f"%{search}%")
+    filters = view.get('filters', {})
+    for column, (label, (sql_column, options)) in zip(st.columns(len(filters) or 1), filters.items()):
+        choice = column.selectbox(label, ['All'] + list(options), key=f"{key}_filter_{label}")
+        if choice != 'All':
+            where.append(f"{sql_column} = ?")
+            params.append(options[choice])
+
+    # Start from the first page whenever the search, filters or sort change
+    list_pages = st.session_state.setdefault('list_pages', {})
+    pages = list_pages.setdefault(key, {'query': None, 'cursors': [None]})
+    query = (search, sort_label, descending, tuple(params))
+    if pages['query'] != query:
+        pages['query'] = query
+        pages['cursors'] = [None]
+
+    while True:
+        rows, next_after = fetch_page(
+            conn, [view['id']] + list(view['columns'].values()), view['from'], view['id'], view['sort'][sort_label],
+            where, params, after=pages['cursors'][-1], descending=descending, page_size=page_size,
+        )
+        if rows or len(pages['cursors']) == 1:
+            break
+        # Every row of this page was deleted; go back to the previous one
+        pages['cursors'].pop()
+    if not rows:
+        st.info("No matching rows.")
+        return None
+
+    event = st.dataframe(
+        [dict(zip(view['columns'], row[1:])) for row in rows],
+        hide_index=True,
+        use_container_width=True,
+        on_select="rerun",
+        selection_mode="single-row",
+        key=f"{key}_grid_{len(pages['cursors'])}",
+    )
+
+    col_previous, col_page, col_next = st.columns([1, 2, 1])
+    if col_previous.button("Previous", key=f"{key}_previous", disabled=len(pages['cursors']) == 1):
+        pages['cursors'].pop()
+        st.rerun()
+    col_page.write(f"Page {len(pages['cursors'])}")
+    if col_next.button("Next", key=f"{key}_next", disabled=next_after is None):
+        pages['cursors'].append(next_after)
+        st.rerun()
+
+    selected = event.selection.rows
+    return rows[selected[0]] if selected else None